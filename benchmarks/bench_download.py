@@ -0,0 +1,184 @@
+'''End-to-end download benchmark against local stand-in server.
+
+Runs download_from for one url of every module, then download_list for
+a generated list of urls of all modules. All requests go to a local
+server (see server.py) with configurable latency and bandwidth.
+Reports urls/s, bytes/s, per-file latency percentiles and peak RSS.
+Run from repository root with PYTHONPATH=src.
+
+Usage:
+    bench_download.py [options]
+
+Options:
+    --latency MS     server response delay in milliseconds [default: 20]
+    --bandwidth KBS  per response bandwidth in KiB/s, 0 - unlimited [default: 0]
+    --pages N        images per gallery/post [default: 10]
+    --size KB        size of every file in KiB [default: 256]
+    --list N         number of urls in download_list run [default: 50]
+    -j WORKERS       download_list workers [default: 8]
+    --rate-limits    keep request rate limits of modules, which
+                     otherwise would dominate measured time
+
+'''
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from docopt import docopt
+from icecream import ic
+
+sys.path.insert(0, str(Path(__file__).absolute().parent))
+
+from server import AsyncLocalTransport, LocalTransport, SiteConfig, serve
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ic.disable()
+
+MODULE_URLS = {
+    'imhentai': 'https://imhentai.xxx/gallery/{n}/',
+    'e-hentai': 'https://e-hentai.org/g/{n}/abcdef{n}/',
+    'kemono': 'https://kemono.party/patreon/user/1/post/{n}',
+    'pixiv': 'https://www.pixiv.net/en/artworks/{n}',
+    'deviantart': 'https://www.deviantart.com/artist/art/deviation-{n}',
+}
+
+file_latencies: list[float] = []
+
+
+def record_latency(func):
+    """Wraps (async) file download method to record its duration"""
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            result = await func(*args, **kwargs)
+            file_latencies.append(time.perf_counter() - start)
+            return result
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        file_latencies.append(time.perf_counter() - start)
+        return result
+    return wrapper
+
+
+def start_server(config: SiteConfig) -> int:
+    """Starts stand-in server in separate process, so it does not
+    affect measured memory and cpu of the scrapper"""
+
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+
+    process = context.Process(
+        target=serve, args=(config, 0, port_queue.put), daemon=True)
+    process.start()
+
+    return port_queue.get(timeout=30)
+
+
+def directory_size(path: Path) -> int:
+    return sum(
+        file.stat().st_size for file in path.rglob('*') if file.is_file()
+    )
+
+
+def peak_rss_mb() -> float | None:
+
+    if not resource:
+        return None
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+
+
+def report(name: str, url_count: int, byte_count: int, elapsed: float):
+
+    latencies = sorted(file_latencies)
+    p50 = statistics.median(latencies) if latencies else 0
+    p99 = latencies[int(len(latencies) * 0.99)] if latencies else 0
+
+    print(
+        f'{name:<28}{url_count / elapsed:>9.2f}'
+        f'{byte_count / elapsed / 1024 ** 2:>10.2f}'
+        f'{p50 * 1000:>9.1f}{p99 * 1000:>9.1f}{len(latencies):>7}'
+    )
+
+
+def main(args):
+
+    config = SiteConfig(
+        pages=int(args.pages),
+        file_size=int(args.size) * 1024,
+        latency=int(args.latency) / 1000,
+        bandwidth=int(args.bandwidth) * 1024,
+    )
+    port = start_server(config)
+
+    # Scrapper writes to relative Data directory
+    work_dir = Path(tempfile.mkdtemp(prefix='image_scrapper_bench_'))
+    os.chdir(work_dir)
+
+    import image_scrapper
+    from image_scrapper.api import AsyncEngine, ScrapperApi, client_factory
+
+    client_factory.use_transports(
+        LocalTransport(port, limits=client_factory.limits),
+        AsyncLocalTransport(port, limits=client_factory.limits),
+    )
+
+    if not args.rate_limits:
+        image_scrapper.module_apis.configure(rate_limiter=None)
+
+    ScrapperApi._download_file = record_latency(ScrapperApi._download_file)
+    AsyncEngine._download_file = record_latency(AsyncEngine._download_file)
+
+    print(f'{"scenario":<28}{"urls/s":>9}{"MiB/s":>10}'
+          f'{"p50, ms":>9}{"p99, ms":>9}{"files":>7}')
+
+    for n, (module, url_template) in enumerate(MODULE_URLS.items(), 1):
+        file_latencies.clear()
+        url = url_template.format(n=1000 + n)
+
+        start = time.perf_counter()
+        byte_count = image_scrapper.download_from(url)
+        report(f'download_from {module}', 1, byte_count,
+               time.perf_counter() - start)
+
+    file_latencies.clear()
+    url_count = int(args.list)
+    templates = list(MODULE_URLS.values())
+    urls = [
+        templates[i % len(templates)].format(n=2000 + i)
+            for i in range(url_count)
+    ]
+
+    size_before = directory_size(work_dir)
+    start = time.perf_counter()
+    image_scrapper.download_list(urls, workers=int(args.j))
+    elapsed = time.perf_counter() - start
+
+    report('download_list', url_count,
+           directory_size(work_dir) - size_before, elapsed)
+
+    if (peak := peak_rss_mb()) is not None:
+        print(f'peak RSS: {peak:.1f} MiB')
+
+
+if __name__ == '__main__':
+    main(docopt(__doc__))
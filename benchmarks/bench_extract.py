@@ -0,0 +1,126 @@
+'''Compares html extraction backends on saved page fixtures.
+
+Every fixture is parsed and queried with the same selectors modules use,
+once per backend. Results of both backends must be equal.
+Run from repository root with PYTHONPATH=src.
+
+Usage:
+    bench_extract.py [-n ROUNDS]
+
+Options:
+    -n ROUNDS  number of parses per fixture and backend [default: 50]
+
+'''
+
+import importlib
+import time
+from pathlib import Path
+from typing import Callable
+
+from docopt import docopt
+from icecream import ic
+
+from image_scrapper.api import GalleryApi, Node, parse_html
+
+FIXTURES = Path(__file__).absolute().parent / 'fixtures'
+
+ic.disable()
+
+pixiv = importlib.import_module('image_scrapper.modules.single_modules.pixiv')
+deviantart = importlib.import_module(
+    'image_scrapper.modules.single_modules.deviantart.main_api')
+stash = importlib.import_module(
+    'image_scrapper.modules.single_modules.deviantart.stash')
+e_hentai = importlib.import_module(
+    'image_scrapper.modules.single_modules.e-hentai')
+imhentai = importlib.import_module(
+    'image_scrapper.modules.gallery_modules.imhentai')
+
+
+def gallery_meta(parse_params) -> Callable[[Node], tuple]:
+    api = GalleryApi(None, parse_params=parse_params)
+    return lambda soup: api.get_gallery_meta(soup, '/g/2345678/abc/')
+
+def big_image(parse_params) -> Callable[[Node], str]:
+    selector, attr = parse_params.big_img_selectors
+    return lambda soup: soup.select_one(selector).attrs[attr]
+
+def ehentai_index(soup: Node) -> list[str]:
+    images_list_tag = soup.select_one('#gdt')
+    return [tag.attrs['href'] for tag in images_list_tag.select('.gdtm a')]
+
+def kemono_post(soup: Node) -> tuple:
+    return (
+        soup.select_one('h1 span').text.strip(),
+        soup.select_one('.post__user-name').text.strip(),
+        [tag.attrs['href'] for tag in soup.select('.fileThumb')],
+        [tag.attrs['download'] for tag in soup.select('.post__attachment-link')],
+    )
+
+def deviation(soup: Node) -> tuple:
+    return (
+        soup.select_one('title').text,
+        deviantart._get_download_url(soup),
+        deviantart._get_description(soup),
+        'Log In' in soup.text,
+    )
+
+def stash_folder(soup: Node) -> list[str]:
+    return [
+        a.attrs['href']
+            for a in soup.select('.stash-thumb-container.already-uploaded a.t')
+    ]
+
+
+EXTRACTORS = {
+    'imhentai_gallery.html': gallery_meta(imhentai.LOCAL_PARSE_PARAMS),
+    'imhentai_view.html': big_image(imhentai.LOCAL_PARSE_PARAMS),
+    'ehentai_index.html': ehentai_index,
+    'ehentai_view.html': big_image(e_hentai.LOCAL_PARSE_PARAMS),
+    'pixiv_artwork.html': pixiv._get_preload_json,
+    'kemono_post.html': kemono_post,
+    'deviantart_deviation.html': deviation,
+    'stash_folder.html': stash_folder,
+    'stash_file.html': stash._get_stash_file,
+}
+
+
+def measure(markup: str, extract: Callable, backend: str, rounds: int):
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = extract(parse_html(markup, backend))
+    elapsed = time.perf_counter() - start
+
+    return result, elapsed / rounds
+
+
+def main(rounds: int):
+
+    print(f'{"fixture":<28}{"soup, ms":>10}{"lxml, ms":>10}{"speedup":>9}')
+
+    totals = {'soup': 0., 'lxml': 0.}
+
+    for fixture, extract in EXTRACTORS.items():
+        markup = (FIXTURES / fixture).read_text(encoding='UTF-8')
+
+        soup_result, soup_time = measure(markup, extract, 'soup', rounds)
+        lxml_result, lxml_time = measure(markup, extract, 'lxml', rounds)
+
+        assert soup_result == lxml_result, \
+            f'{fixture}: {soup_result!r} != {lxml_result!r}'
+
+        totals['soup'] += soup_time
+        totals['lxml'] += lxml_time
+
+        print(f'{fixture:<28}{soup_time * 1000:>10.2f}'
+              f'{lxml_time * 1000:>10.2f}{soup_time / lxml_time:>8.1f}x')
+
+    print(f'{"total":<28}{totals["soup"] * 1000:>10.2f}'
+          f'{totals["lxml"] * 1000:>10.2f}'
+          f'{totals["soup"] / totals["lxml"]:>8.1f}x')
+
+
+if __name__ == '__main__':
+    args = docopt(__doc__)
+    main(int(args.n))
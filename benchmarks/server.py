@@ -0,0 +1,474 @@
+'''Local stand-in server for every supported site.
+
+Serves synthetic pages, api responses and files for imhentai, e-hentai,
+kemono, pixiv (including ugoira api), deviantart and sta.sh. Site is
+chosen by Host header, so real site urls are used and only the transport
+(see LocalTransport) sends requests to the local address.
+
+Pages are padded with noise markup to have realistic parsing cost.
+Every response can be delayed (latency) and throttled (bandwidth).
+'''
+
+import hashlib
+import json
+import re
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+CHUNK_SIZE = 16 * 1024
+
+IMHENTAI_IMAGES = 'm7.imhentai.xxx'
+EHENTAI_IMAGES = 'abc.hath.network'
+PIXIV_IMAGES = 'i.pximg.net'
+DEVIANTART_IMAGES = 'images-wixmp-ed30a86b8c4ca887773594c2.wixmp.com'
+
+
+@dataclass
+class SiteConfig:
+    """Shape of synthetic content
+
+    Attrs:
+        pages: images per gallery / post / illustration
+        file_size: size of every served file in bytes
+        latency: seconds before response is sent
+        bandwidth: bytes per second per response (0 - unlimited)
+        noise: number of filler elements in every page
+    """
+
+    pages: int = 10
+    file_size: int = 256 * 1024
+    latency: float = 0.02
+    bandwidth: int = 0
+    noise: int = 200
+
+
+# ^ ---- Page builders
+
+def _noise(count: int) -> str:
+    return ''.join(
+        f'<div class="item item-{i % 7}"><a href="/link/{i}">link {i}</a>'
+        f'<p>filler text number {i} for parser</p></div>'
+            for i in range(count)
+    )
+
+def _page(config: SiteConfig, title: str, body: str, head: str = '') -> str:
+    return (
+        f'<!DOCTYPE html><html><head><meta charset="utf-8">'
+        f'<title>{title}</title>{head}</head><body>'
+        f'<nav>{_noise(config.noise // 4)}</nav>{body}'
+        f'<footer>{_noise(config.noise)}</footer></body></html>'
+    )
+
+
+def imhentai_gallery(config: SiteConfig, gal_id: str) -> str:
+    return _page(config, f'Gallery {gal_id}', (
+        f'<h1>Gallery {gal_id}</h1>'
+        f'<ul><li class="pages">Pages: {config.pages}</li></ul>'
+    ))
+
+def imhentai_view(config: SiteConfig, gal_id: str, page_n: str) -> str:
+    return _page(config, f'Gallery {gal_id} - {page_n}', (
+        f'<img id="gimg" data-src="https://{IMHENTAI_IMAGES}'
+        f'/001/{gal_id}/{page_n}.jpg" src="/loading.gif">'
+    ))
+
+# e-hentai shows this many thumbnails per index page
+EHENTAI_PAGE_SIZE = 40
+
+def ehentai_index(config: SiteConfig, gid: str, token: str, index_n: int) -> str:
+
+    index_count = -(-config.pages // EHENTAI_PAGE_SIZE)
+    first = index_n * EHENTAI_PAGE_SIZE + 1
+    last = min(first + EHENTAI_PAGE_SIZE - 1, config.pages)
+
+    ptt = ''.join(
+        f'<td><a href="https://e-hentai.org/g/{gid}/{token}/?p={i}">{i + 1}</a></td>'
+            for i in range(index_count)
+    )
+    thumbs = ''.join(
+        f'<div class="gdtm"><div><a href="https://e-hentai.org/s/'
+        f'{_key(gid, n)}/{gid}-{n}"><img src="/blank.gif"></a></div></div>'
+            for n in range(first, last + 1)
+    )
+
+    return _page(config, f'Gallery {gid}', (
+        f'<h1 id="gn">Gallery {gid}</h1>'
+        f'<table class="ptt"><tr><td>&lt;</td>{ptt}<td>&gt;</td></tr></table>'
+        f'<div id="gdt">{thumbs}</div>'
+    ))
+
+def ehentai_view(config: SiteConfig, gid: str, page_n: str) -> str:
+    return _page(config, f'Gallery {gid} - {page_n}', (
+        f'<div id="i3"><a href="#"><img id="img" src="https://{EHENTAI_IMAGES}'
+        f'/h/{gid}/{page_n}.jpg"></a></div>'
+        f'<script>var showkey="{_key(gid, "showkey")}";</script>'
+    ))
+
+def ehentai_showpage(config: SiteConfig, request: dict) -> str:
+    gid, page = request['gid'], request['page']
+    return json.dumps({
+        'p': page,
+        'i3': f'<a href="#"><img id="img" src="https://{EHENTAI_IMAGES}'
+              f'/h/{gid}/{page}.jpg" style="height:100px" /></a>',
+    })
+
+def kemono_post(config: SiteConfig, service: str, user: str, post_id: str) -> str:
+
+    files = ''.join(
+        f'<a class="fileThumb" href="https://kemono.party/data/{post_id}/{i}.png">'
+        f'<img src="/thumb.png"></a>'
+            for i in range(config.pages)
+    )
+    attachment = (
+        f'<a class="post__attachment-link" download="archive%20{post_id}.zip" '
+        f'href="https://kemono.party/data/{post_id}/archive.zip">Download</a>'
+    )
+
+    return _page(config, f'Post {post_id}', (
+        f'<h1 class="post__title"><span>Post {post_id}</span></h1>'
+        f'<a class="post__user-name" href="/{service}/user/{user}">Creator {user}</a>'
+        f'<ul>{attachment}</ul><div class="post__files">{files}</div>'
+    ))
+
+def _kemono_post_json(config: SiteConfig, service: str, user: str, post_id: str) -> dict:
+    files = [
+        {'name': f'{i}.png', 'path': f'/{post_id}/{i}.png'}
+            for i in range(config.pages)
+    ]
+    return {
+        'id': post_id, 'user': user, 'service': service,
+        'title': f'Post {post_id}',
+        'file': files[0] if files else {},
+        'attachments': files + [
+            {'name': f'archive {post_id}.zip', 'path': f'/{post_id}/archive.zip'}
+        ],
+    }
+
+def kemono_api_post(config: SiteConfig, service: str, user: str, post_id: str) -> str:
+    return json.dumps({'post': _kemono_post_json(config, service, user, post_id)})
+
+def kemono_api_profile(config: SiteConfig, service: str, user: str) -> str:
+    return json.dumps({'id': user, 'service': service, 'name': f'Creator {user}'})
+
+# Creator has as many posts as post has files, split into pages of this size
+KEMONO_PAGE_SIZE = 50
+
+def kemono_api_posts(config: SiteConfig, service: str, user: str, offset: int) -> str:
+    post_count = config.pages
+    return json.dumps([
+        _kemono_post_json(config, service, user, f'{user}{n}')
+            for n in range(offset, min(offset + KEMONO_PAGE_SIZE, post_count))
+    ])
+
+def pixiv_artwork(config: SiteConfig, px_id: str) -> str:
+
+    # Every third illustration is animated
+    ugoira = int(px_id) % 3 == 0
+    original = (
+        f'https://{PIXIV_IMAGES}/img-original/img/2024/01/01/00/00/00/'
+        + (f'{px_id}_ugoira0.jpg' if ugoira else f'{px_id}_p0.png')
+    )
+    preload = {'illust': {px_id: {
+        'illustTitle': f'Illustration {px_id}',
+        'userName': 'artist',
+        'pageCount': 1 if ugoira else config.pages,
+        'urls': {'original': original},
+    }}}
+    meta = json.dumps(preload).replace("'", '&#39;')
+
+    return _page(
+        config, f'Illustration {px_id}', '<div id="root"></div>',
+        head=f"<meta id=\"meta-preload-data\" content='{meta}'>")
+
+def _ajax(body) -> str:
+    return json.dumps({'error': False, 'message': '', 'body': body})
+
+def pixiv_user(config: SiteConfig, user_id: str) -> str:
+    return _page(config, f'User {user_id}', '<div id="root"></div>')
+
+def pixiv_profile(config: SiteConfig, user_id: str) -> str:
+    # User has as many works as illustration has pages
+    work_ids = [str(int(user_id) * 1000 + i) for i in range(config.pages)]
+    return _ajax({
+        'illusts': {work_id: None for work_id in work_ids[::2]},
+        'manga': {work_id: None for work_id in work_ids[1::2]},
+    })
+
+def pixiv_works(config: SiteConfig, user_id: str, work_ids: list[str]) -> str:
+    return _ajax({'works': {
+        work_id: {
+            'id': work_id,
+            'title': f'Illustration {work_id}',
+            'userName': 'artist',
+            'illustType': 2 if int(work_id) % 3 == 0 else 0,
+            'pageCount': config.pages,
+        }
+            for work_id in work_ids
+    }})
+
+def pixiv_pages(config: SiteConfig, px_id: str) -> str:
+    return _ajax([
+        {'urls': {'original': f'https://{PIXIV_IMAGES}/img-original/img/'
+                              f'2024/01/01/00/00/00/{px_id}_p{i}.png'}}
+            for i in range(config.pages)
+    ])
+
+def ugoira_queue(config: SiteConfig, px_id: str) -> str:
+    return json.dumps({'data': [{'preview': {
+        'mp4': f'https://ugoira.com/files/{px_id}.mp4'
+    }}]})
+
+def ugoira_meta(config: SiteConfig, px_id: str) -> str:
+    return _ajax({
+        'originalSrc': f'https://{PIXIV_IMAGES}/img-zip-ugoira/img/'
+                       f'{px_id}_ugoira1920x1080.zip',
+        'frames': [
+            {'file': f'{i:06}.jpg', 'delay': 100} for i in range(config.pages)
+        ],
+    })
+
+def deviation(config: SiteConfig, da_id: str) -> str:
+
+    stash_links = ''.join(
+        f'<a href="https://sta.sh/0{da_id}{i}?ref=x">stash {i}</a> '
+            for i in range(2)
+    )
+
+    return _page(config, f'Deviation {da_id} by artist on DeviantArt', (
+        f'<main><a data-hook="download_button" href="https://{DEVIANTART_IMAGES}'
+        f'/f/{da_id}/deviation_{da_id}.png?token=x">Download</a>'
+        f'<div class="legacy-journal">Description of {da_id}. {stash_links}</div>'
+        f'</main>'
+    ))
+
+# Gallery has five deviations per illustration page
+DEVIANTART_GALLERY_RATIO = 5
+
+def deviantart_gallery(config: SiteConfig, username: str, offset: int, limit: int) -> str:
+    total = config.pages * DEVIANTART_GALLERY_RATIO
+    return json.dumps({
+        'hasMore': offset + limit < total,
+        'nextOffset': offset + limit,
+        'results': [
+            {'deviation': {
+                'deviationId': 9000 + n,
+                'url': f'https://www.deviantart.com/{username}/art/deviation-{9000 + n}',
+            }}
+                for n in range(offset, min(offset + limit, total))
+        ],
+    })
+
+def stash_page(config: SiteConfig, stash_id: str) -> str:
+
+    # Ids ending with 0 are folders with one file per page
+    if stash_id.endswith('0'):
+        items = ''.join(
+            f'<div class="stash-thumb-container already-uploaded">'
+            f'<a class="t" href="https://sta.sh/0{stash_id}f{i}x">item</a></div>'
+                for i in range(config.pages)
+        )
+        return _page(config, 'Folder', f'<h2>Folder {stash_id}</h2>{items}')
+
+    return _page(config, 'Stash file', (
+        f'<img collect_rid="1" src="/thumb.jpg">'
+        f'<img collect_rid="2" src="https://{DEVIANTART_IMAGES}/f/{stash_id}.png">'
+        f'<a class="title" href="#">Stash {stash_id}</a>'
+    ))
+
+
+def _key(*parts) -> str:
+    return hashlib.md5('-'.join(map(str, parts)).encode()).hexdigest()[:10]
+
+
+# ^ ---- Routing
+
+Route = tuple[str, re.Pattern, Callable[..., str], str]
+
+HTML = 'text/html; charset=utf-8'
+JSON = 'application/json'
+
+ROUTES: list[Route] = [
+    ('imhentai.xxx', re.compile(r'/gallery/(\d+)/'), imhentai_gallery, HTML),
+    ('imhentai.xxx', re.compile(r'/view/(\d+)/(\d+)'), imhentai_view, HTML),
+    ('e-hentai.org', re.compile(r'/s/\w+/(\d+)-(\d+)'), ehentai_view, HTML),
+    ('www.pixiv.net', re.compile(r'/(?:en/)?artworks/(\d+)'), pixiv_artwork, HTML),
+    ('www.pixiv.net', re.compile(r'/(?:en/)?users/(\d+)'), pixiv_user, HTML),
+    ('www.pixiv.net', re.compile(r'/ajax/user/(\d+)/profile/all'), pixiv_profile, JSON),
+    ('www.pixiv.net', re.compile(r'/ajax/illust/(\d+)/pages'), pixiv_pages, JSON),
+    ('www.pixiv.net', re.compile(r'/ajax/illust/(\d+)/ugoira_meta'), ugoira_meta, JSON),
+    ('www.deviantart.com', re.compile(r'/[\w-]+/art/[\w-]+-(\d+)'), deviation, HTML),
+    ('sta.sh', re.compile(r'/0(\w+)'), stash_page, HTML),
+    ('kemono.party', re.compile(r'/(\w+)/user/(\w+)/post/(\w+)'), kemono_post, HTML),
+    ('kemono.party', re.compile(r'/api/v1/(\w+)/user/(\w+)/post/(\w+)'), kemono_api_post, JSON),
+    ('kemono.party', re.compile(r'/api/v1/(\w+)/user/(\w+)/profile'), kemono_api_profile, JSON),
+]
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    config: SiteConfig = SiteConfig()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._handle()
+
+    def do_POST(self):
+        length = int(self.headers.get('content-length', 0))
+        self._handle(self.rfile.read(length).decode())
+
+    def _handle(self, body: str = ''):
+
+        time.sleep(self.config.latency)
+
+        host = self.headers.get('host', '').split(':')[0]
+        url = urlsplit(self.path)
+
+        if host == 'e-hentai.org' and (match := re.match(r'/g/(\d+)/(\w+)/', url.path)):
+            index_n = int(parse_qs(url.query).get('p', ['0'])[0])
+            page = ehentai_index(self.config, match[1], match[2], index_n)
+            return self._send_content(page.encode(), HTML)
+
+        if host == 'api.e-hentai.org' and url.path == '/api.php':
+            return self._send_content(
+                ehentai_showpage(self.config, json.loads(body)).encode(), JSON)
+
+        if host == 'www.pixiv.net' and (match := re.match(r'/ajax/user/(\d+)/profile/illusts', url.path)):
+            work_ids = parse_qs(url.query).get('ids[]', [])
+            return self._send_content(
+                pixiv_works(self.config, match[1], work_ids).encode(), JSON)
+
+        if host == 'kemono.party' and (match := re.fullmatch(r'/api/v1/(\w+)/user/(\w+)', url.path)):
+            offset = int(parse_qs(url.query).get('o', ['0'])[0])
+            return self._send_content(kemono_api_posts(
+                self.config, match[1], match[2], offset).encode(), JSON)
+
+        if host == 'www.deviantart.com' and url.path.endswith('/gallery/contents'):
+            query = parse_qs(url.query)
+            return self._send_content(deviantart_gallery(
+                self.config, query['username'][0],
+                int(query['offset'][0]), int(query['limit'][0])).encode(), JSON)
+
+        if host == 'ugoira.com' and url.path == '/api/illusts/queue':
+            px_id = parse_qs(body).get('text', [''])[0]
+            return self._send_content(
+                ugoira_queue(self.config, px_id).encode(), JSON)
+
+        for route_host, pattern, builder, content_type in ROUTES:
+            if host == route_host and (match := pattern.match(url.path)):
+                page = builder(self.config, *match.groups())
+                return self._send_content(page.encode(), content_type)
+
+        # Anything else is a file
+        return self._send_file()
+
+    def _send_content(self, content: bytes, content_type: str):
+        self.send_response(200)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(content)))
+        self.end_headers()
+        self._write(content)
+
+    def _send_file(self):
+
+        size = self.config.file_size
+        start = 0
+
+        if (range_header := self.headers.get('range')):
+            start = int(re.match(r'bytes=(\d+)-', range_header)[1])
+
+        if start >= size > 0:
+            self.send_response(416)
+            self.send_header('content-range', f'bytes */{size}')
+            self.send_header('content-length', '0')
+            self.end_headers()
+            return
+
+        if start:
+            self.send_response(206)
+            self.send_header('content-range', f'bytes {start}-{size - 1}/{size}')
+        else:
+            self.send_response(200)
+
+        # Content depends on path, so different files have different hashes
+        seed = hashlib.sha256(self.path.encode()).digest()
+        content = (seed * (size // len(seed) + 1))[start:size]
+
+        self.send_header('content-type', 'application/octet-stream')
+        self.send_header('content-length', str(len(content)))
+        self.end_headers()
+        self._write(content)
+
+    def _write(self, content: bytes):
+
+        bandwidth = self.config.bandwidth
+
+        if not bandwidth:
+            self.wfile.write(content)
+            return
+
+        for i in range(0, len(content), CHUNK_SIZE):
+            chunk = content[i:i + CHUNK_SIZE]
+            self.wfile.write(chunk)
+            time.sleep(len(chunk) / bandwidth)
+
+
+def serve(config: SiteConfig, port: int = 0, ready: Callable[[int], None] = None):
+    """Runs server forever. Calls [ready] with bound port."""
+
+    handler = type('Handler', (StandInHandler,), {'config': config})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+
+    if ready:
+        ready(server.server_address[1])
+
+    server.serve_forever()
+
+
+def _local_request(request: httpx.Request, port: int) -> httpx.Request:
+    """Copy of request sent to local server. Original request (and url)
+    is kept, so responses look like they came from the real site."""
+    return httpx.Request(
+        request.method,
+        request.url.copy_with(scheme='http', host='127.0.0.1', port=port),
+        headers=request.headers,
+        stream=request.stream,
+        extensions=request.extensions,
+    )
+
+
+class LocalTransport(httpx.HTTPTransport):
+
+    def __init__(self, port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.port = port
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return super().handle_request(_local_request(request, self.port))
+
+
+class AsyncLocalTransport(httpx.AsyncHTTPTransport):
+
+    def __init__(self, port: int, **kwargs):
+        super().__init__(**kwargs)
+        self.port = port
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await super().handle_async_request(
+            _local_request(request, self.port))
+
+
+__all__ = [
+    'SiteConfig',
+    'LocalTransport',
+    'AsyncLocalTransport',
+    'serve',
+]
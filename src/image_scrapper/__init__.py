@@ -1,26 +1,63 @@
 '''Image scrapper console app v0.1
 
 Usage:
-    image_scrapper.py URLS...
-    image_scrapper.py -f URL_FILE
+    image_scrapper.py [options] URLS...
+    image_scrapper.py [options] -f URL_FILE
+    image_scrapper.py --list-modules
+    image_scrapper.py --missing
 
 Options:
-    -h           show this message
-    -f URL_FILE  specify text file with urls
+    -h                show this message
+    -f URL_FILE       specify text file with urls
+    -j WORKERS        number of urls from file processed in parallel
+    --host-workers N  number of urls of one site processed in parallel
+    --list-modules    show supported sites and exit
+    --index           record downloaded files in index and skip files
+                      recorded as downloaded
+    --missing         list indexed files which failed or were interrupted
+                      and exit
+    --cache           cache pages and revalidate them on next runs,
+                      keep resolved sta.sh links for some hours
+    --cache-ttl SECS  use cached pages without revalidation for SECS seconds
+    --dedup MODE      store files with same contents once, as "hardlink"
+                      or "reflink"
+    --sync            remember newest works of creators and users; next runs
+                      download only works added since
+    --watch MINS      repeat run every MINS minutes (implies --sync)
+    --parse-processes N
+                      parse pages in N processes, so html parsing
+                      uses several cpu cores
+    --http2           multiplex requests to same host over one connection
+    --chunk-size KIB  receive and write files in chunks of KIB kibibytes
+    --fsync MODE      flush downloaded files to disk: "never", "file"
+                      (before file is complete) or "full" (also its directory)
+    --dump-pages      save every parsed page to [module].html for debugging
+    --metrics FILE    write per stage timings to FILE at the end of run
+                      (Prometheus text format if FILE ends with .prom,
+                      json otherwise)
+    --profile PREFIX  profile every url from command line with cProfile and
+                      tracemalloc into PREFIX-N.prof and PREFIX-N.mem.txt
 
 '''
 
 import re
+import time
 from pathlib import Path
 from typing import Iterable
 
 from docopt import ParsedOptions, docopt
 from icecream import ic
 
+from .batch import run_batch
+from .constants.network import LIST_HOST_WORKERS, LIST_WORKERS
+from .helpers import metrics, profile
 from .modules import module_apis
 
 
-HOST_PATTERN = re.compile('https:\/\/(?:.+\.)?([a-z\-]+)\.[a-z]{3}')
+# Site name is the last label before top level domain of any length
+# (e.g. kemono.su, sta.sh)
+HOST_PATTERN = re.compile(
+    'https?:\/\/(?:[\w\-]+\.)*?([a-z\-]+)\.[a-z]{2,}(?=[:\/?#]|$)')
 
 def get_url_host(url: str) -> str:
 
@@ -32,11 +69,14 @@ def get_url_host(url: str) -> str:
     return search[1]
 
 
-def download_from(url: str):
+def download_from(url: str) -> int | None:
+    """Downloads package from url.
+    
+    Returns number of bytes written or None if url was skipped."""
 
     if url.startswith('#'):
         ic('Skipping escaped line!')
-        return
+        return None
     
     host = get_url_host(url)
 
@@ -44,29 +84,148 @@ def download_from(url: str):
 
     if not downloader:
         ic(f'Unknown url: {url}!')
-        return
+        return None
+
+    return downloader.download_from(url)
 
-    downloader.download_from(url)
+def canonical_url(url: str) -> str | None:
+    """Key of package url points to, None for lines which are not
+    urls of supported sites."""
 
-def download_list(url_list: Iterable[str]):
+    if not url or url.startswith('#'):
+        return None
 
-    for i, url in enumerate(url_list):
-        url = url.strip()
-        ic(f'[Line {i+1}] - {url}')
-        download_from(url)
+    if not (downloader := module_apis.get(get_url_host(url))):
+        return None
 
-def main(args: ParsedOptions):
+    return downloader.canonical_url(url)
+
+def download_list(
+        url_list: Iterable[str],
+        workers: int = LIST_WORKERS,
+        host_workers: int = LIST_HOST_WORKERS):
+
+    summary = run_batch(
+        (url.strip() for url in url_list),
+        download_from, get_url_host,
+        workers=workers, host_workers=host_workers, get_key=canonical_url,
+    )
+
+    ic(f'Summary: {summary}')
+
+def download_urls(urls: Iterable[str], profile_prefix: str | None = None):
+
+    if profile_prefix:
+        # Profiler sees only current thread, so download files in it
+        module_apis.configure(download_workers=1)
+
+    for i, url in enumerate(urls, 1):
+
+        if not profile_prefix:
+            download_from(url)
+            continue
+
+        with profile(Path(f'{profile_prefix}-{i}')):
+            download_from(url)
+
+def list_modules():
+    for name in sorted(module_apis):
+        print(name)
+
+def list_missing():
+
+    from .api import DownloadIndex
+
+    for entry in DownloadIndex().entries():
+        print('\t'.join((
+            entry.status, entry.path, entry.unit_url, entry.source_url,
+            entry.error or '',
+        )))
+
+def configure_modules(args: ParsedOptions):
+    """Applies command line options to module apis"""
+
+    # Imported here to keep module listing free of http libraries
+    from .api import (
+        DedupStore, DownloadIndex, ParsePool, ResponseCache, SyncState,
+        WriteOptions, client_factory
+    )
+
+    # Must be set before any module creates its client
+    if args.http2:
+        client_factory.http2 = True
+
+    if args.cache:
+        cache = ResponseCache()
+        if args.cache_ttl:
+            cache.ttl = float(args.cache_ttl)
+
+        module_apis.configure(cache=cache)
+
+    if args.dedup:
+        module_apis.configure(dedup=DedupStore(link_mode=args.dedup))
+
+    if args.index:
+        module_apis.configure(index=DownloadIndex())
+
+    if args.parse_processes:
+        module_apis.configure(
+            parse_pool=ParsePool(int(args.parse_processes)))
+
+    if args.dump_pages:
+        module_apis.configure(dump_pages=True)
+
+    if args.sync or args.watch:
+        module_apis.configure(sync=SyncState())
+
+    write_options = {}
+    if args.chunk_size:
+        write_options['chunk_size'] = int(args.chunk_size) * 1024
+    if args.fsync:
+        write_options['fsync'] = args.fsync
+
+    if write_options:
+        module_apis.configure(write_options=WriteOptions(**write_options))
+
+def run(args: ParsedOptions):
 
     if (url_file_path := args.f):
 
+        workers = int(args.j or LIST_WORKERS)
+        host_workers = int(args.host_workers or LIST_HOST_WORKERS)
+
         with Path(url_file_path).open() as file:
-            download_list(file)
+            download_list(file, workers, host_workers)
 
         ic('List download finished!')
         return
-    
-    for url in args.URLS:
-        download_from(url)
+
+    download_urls(args.URLS, args.profile)
+
+def main(args: ParsedOptions):
+
+    if args.list_modules:
+        list_modules()
+        return
+
+    if args.missing:
+        list_missing()
+        return
+
+    configure_modules(args)
+
+    metrics.enabled = bool(args.metrics)
+
+    try:
+        run(args)
+
+        while args.watch:
+            ic(f'Next run in {args.watch} minutes')
+            time.sleep(float(args.watch) * 60)
+            run(args)
+    finally:
+        if args.metrics:
+            metrics.export(Path(args.metrics))
 
 def main_cli():
     args = docopt(__doc__)
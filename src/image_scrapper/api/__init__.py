@@ -1,2 +1,12 @@
 from .api_base import *
-from .api_gallery import *
\ No newline at end of file
+from .api_gallery import *
+from .api_engine import *
+from .api_storage import *
+from .api_cache import *
+from .api_dedup import *
+from .api_index import *
+from .api_client import *
+from .api_extract import *
+from .api_offload import *
+from .api_ratelimit import *
+from .api_sync import *
\ No newline at end of file
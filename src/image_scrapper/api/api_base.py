@@ -1,16 +1,28 @@
 
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Iterable, Callable
+from functools import partial
+from typing import Any, Iterable, Callable
 
 import httpx
 from icecream import ic
 
-from image_scrapper.helpers import replace_win_path_symbols, retry_times
-
-# % From stackoverflow to prevent ssl dh key too small error
-httpx._config.DEFAULT_CIPHERS += ":ALL:@SECLEVEL=1"
+from image_scrapper.constants.network import (
+    DOWNLOAD_HOST_WORKERS, DOWNLOAD_WORKERS)
+from image_scrapper.helpers import (
+    canonicalize_url, dump_response_text, metrics, replace_win_path_symbols,
+    retry_times, url_host)
+
+from .api_cache import ResponseCache
+from .api_client import client_factory
+from .api_dedup import DedupStore
+from .api_engine import BASE_SUCCESS_MESSAGE, AsyncEngine
+from .api_index import DownloadIndex
+from .api_offload import ParsePool
+from .api_ratelimit import FILE, PAGE, RateLimiter, RateLimits
+from .api_storage import PartialDownload, WriteOptions, ensure_parent_dir
+from .api_sync import SyncState
 
 # ? Not sure if using different user agent will always allow to bypass
 # ?  bot checks. Most likely if something is blocked by cloudflare check
@@ -19,8 +31,6 @@ BASE_HEADERS = {
     'user-agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/71.0.3542.0 Safari/537.36',
 }
 
-BASE_SUCCESS_MESSAGE = '{} download finished: {}!'
-
 
 class UnloggedError(Exception):
     """Site requires user login to view some content (deviantart, pixiv, etc.)"""
@@ -89,6 +99,16 @@ class DownloadPackage(ABC):
         # ! Replace with debug logging
         ic(self)
 
+    def contents_by_package(
+            self) -> Iterable[tuple['DownloadPackage', DownloadUnit]]:
+        """Contents with package each unit belongs to"""
+        for unit in self.contents:
+            yield self, unit
+
+    def on_downloaded(self):
+        """Called after all package contents are downloaded without errors"""
+        ...
+
 @dataclass
 class BasicPackage(DownloadPackage):
 
@@ -108,95 +128,327 @@ class AuthorPackage(BasicPackage):
         self.author = replace_win_path_symbols(self.author)
         return super().__post_init__()
 
+@dataclass
+class CollectionPackage(DownloadPackage):
+    """Package made of other packages (e.g. all works of an artist).
+
+    Packages may be a lazy iterator, resolved while previous packages
+    are being downloaded."""
+
+    id: str
+    packages: Iterable[DownloadPackage]
+
+    # E.g. saves sync state of source
+    downloaded_callback: Callable[[], None] | None = field(
+        default=None, repr=False)
+
+    @property
+    def contents(self) -> Iterable[DownloadUnit]:
+        for package in self.packages:
+            yield from package.contents
+
+    def contents_by_package(
+            self) -> Iterable[tuple[DownloadPackage, DownloadUnit]]:
+        for package in self.packages:
+            yield from package.contents_by_package()
+
+    def on_downloaded(self):
+        if self.downloaded_callback:
+            self.downloaded_callback()
+
 # ^ ------------------------------------------------
 
 @dataclass
 class ScrapperApi(ABC):
 
     client: httpx.Client
+
+    # Name of module api belongs to. Set by module registry
+    module_name: str = field(default='', kw_only=True)
+
+    # Package files download concurrency. 1 means sequential download
+    download_workers: int = field(default=DOWNLOAD_WORKERS, kw_only=True)
+    host_workers: int = field(default=DOWNLOAD_HOST_WORKERS, kw_only=True)
+
+    # Optional page cache used by get requests
+    cache: ResponseCache | None = field(default=None, kw_only=True)
+
+    # Optional store linking files with same contents
+    dedup: DedupStore | None = field(default=None, kw_only=True)
+
+    # Optional index of downloaded files. If set, files recorded
+    # as downloaded are skipped
+    index: DownloadIndex | None = field(default=None, kw_only=True)
+
+    # Optional per-host request rate limits, shared by all workers
+    rate_limiter: RateLimiter | None = field(default=None, kw_only=True)
+
+    # Optional state of synced sources. If set, bulk downloads
+    # (creators, users) stop at items downloaded by previous runs
+    sync: SyncState | None = field(default=None, kw_only=True)
+
+    # Optional process pool pages are parsed in (see extract)
+    parse_pool: ParsePool | None = field(default=None, kw_only=True)
+
+    # Save every parsed page to [module name].html, for debugging
+    dump_pages: bool = field(default=False, kw_only=True)
+
+    # Chunk size, buffering, preallocation and fsync of downloaded files
+    write_options: WriteOptions = field(
+        default_factory=WriteOptions, kw_only=True)
     
     @abstractmethod
     def parse(self, response: httpx.Response) -> DownloadPackage:
         ...
 
-    def download_from(self, url: str):
+    def extract(
+            self, extractor: Callable[..., Any], response: httpx.Response,
+            *args: Any) -> Any:
+        """Extracts data from page with extractor(markup, *args).
+
+        With parse pool extractor runs in another process, so it must be
+        a module level function returning small picklable result."""
+
+        if self.parse_pool:
+            return self.parse_pool.extract(extractor, response, *args)
+
+        return extractor(response.text, *args)
+
+    def canonical_url(self, url: str) -> str:
+        """Same key for all urls of one package, used to drop duplicates
+        from url lists. Only the first url is downloaded, as it is.
+
+        May be redefined by modules which have several urls for a package."""
+        return canonicalize_url(url)
+
+    def request_url(self, url: str) -> str:
+        """Url requested for page url by download_from.
+
+        May be redefined by modules to request json api instead of page."""
+        return url
+
+    def download_from(self, url: str) -> int:
+        """Downloads package from url. Returns number of bytes written."""
         
-        response = self.get(url)
+        response = self.get(self.request_url(url))
+
+        if self.dump_pages:
+            dump_response_text(response, self.module_name)
 
+        # Collections parse pages of their items while being downloaded,
+        # so login may turn out to be required during download too
         try:
-            package = self.parse(response)
+            with metrics.measure('parse', self.module_name, url_host(url)):
+                package = self.parse(response)
+
+            written = self._download_package(package, url)
         except UnloggedError:
             ic('Please, restart program!')
             exit(1)
-            
-        self._download_package(package)
+
+        package.on_downloaded()
+
+        return written
+
+    def collect(
+            self, source: str, items: Iterable[Any],
+            get_id: Callable[[Any], str],
+            make_packages: Callable[[Iterable[Any]], Iterable[DownloadPackage]],
+            ) -> CollectionPackage:
+        """Package of all items of bulk source (creator, user, gallery).
+
+        With sync enabled, items end at the first item downloaded by
+        previous runs, and new items are remembered after download.
+
+        Args:
+            source: source id, unique within module [str]
+            items: source items, newest first [Iterable]
+            get_id: function returning item id
+            make_packages: function making packages of items (lazily)
+        """
+
+        downloaded_callback = None
+
+        if self.sync:
+            source_key = f'{self.module_name}/{source}'
+            items = self.sync.new_items(source_key, items, get_id)
+            downloaded_callback = partial(self.sync.commit, source_key)
+
+        return CollectionPackage(
+            source, make_packages(items), downloaded_callback)
 
     # ^ ---- Http Client wrappers
 
-    @retry_times(5)
+    @retry_times()
     def get(self, url: str):
-        """Get request wrapper which repeats on exception."""
-        return self.client.get(url)
+        """Get request wrapper which repeats on transient errors.
+        
+        Uses page cache if api has one. Raises httpx.HTTPStatusError
+        on error status."""
+
+        # Fresh cached pages are not requested, so they don't use up
+        # rate limit
+        wait = self.rate_limiter and partial(self.rate_limiter.wait, PAGE, url)
+
+        if wait and not self.cache:
+            wait()
+
+        with metrics.measure(
+                'get', self.module_name, url_host(url)) as measurement:
+
+            if self.cache:
+                response = self.cache.get(self.client, url, before_send=wait)
+            else:
+                response = self.client.get(url)
+
+            measurement.status = response.status_code
+            measurement.bytes = len(response.content)
+
+            response.raise_for_status()
+
+        return response
     
-    @retry_times(5)
-    def post(self, url: str, payload: dict):
-        """Post request wrapper which repeats on exception."""
-        return self.client.post(url, data=payload)
+    @retry_times()
+    def post(self, url: str, payload: dict | None = None, *, json=None):
+        """Post request wrapper which repeats on transient errors.
+
+        Sends payload as form data, or json as json body."""
+
+        if self.rate_limiter:
+            self.rate_limiter.wait(PAGE, url)
+
+        with metrics.measure(
+                'post', self.module_name, url_host(url)) as measurement:
+
+            response = self.client.post(url, data=payload, json=json)
+
+            measurement.status = response.status_code
+            measurement.bytes = len(response.content)
+
+            response.raise_for_status()
+
+        return response
 
     # ^ ---- Download methods
 
-    def _download_package(self, package: DownloadPackage):
+    def _download_package(
+            self, package: DownloadPackage, source_url: str = '') -> int:
+        """Downloads all package units. Returns number of bytes written."""
 
-        for unit in package.contents:
+        units = package.contents
+        if self.index:
+            units = self.index.track(
+                package.contents_by_package(), source_url, self.module_name)
+
+        if self.download_workers > 1:
+            engine = AsyncEngine(
+                self, self.download_workers, self.host_workers)
+            return engine.download(units)
+
+        written = 0
+        created_dirs: set[Path] = set()
+
+        for unit in units:
 
             contents = unit.contents
             file_path = unit.file_path
-            file_path.parent.mkdir(exist_ok=True, parents=True)
+            ensure_parent_dir(file_path, created_dirs)
 
             if unit.kind == 'text':
-                self._write_text(contents, file_path)
+                written += self._write_text(contents, file_path)
                 continue
 
             if unit.kind == 'file':
-                self._download_file(contents, file_path)
+                try:
+                    written += self._download_file(contents, file_path)
+                except Exception as error:
+                    if self.index:
+                        self.index.fail(file_path, error)
+                    raise
                 continue
 
-    @retry_times(5)
-    def _download_file(self, from_url: str, to_path: Path):
-        """Downloads one file"""
+        return written
 
-        success_message = BASE_SUCCESS_MESSAGE.format('File', to_path)
+    @retry_times()
+    def _download_file(self, from_url: str, to_path: Path) -> int:
+        """Downloads one file. Resumes partially downloaded file.
         
-        with self.client.stream('GET', from_url) as stream:
-            ic(stream)
+        Returns number of bytes received."""
+
+        success_message = BASE_SUCCESS_MESSAGE.format('File', to_path)
+
+        download = PartialDownload(
+            to_path, hashed=bool(self.dedup or self.index),
+            options=self.write_options)
+
+        if download.is_complete():
+            ic(f'Skipping downloaded file: {to_path}')
+            if self.index:
+                self.index.complete(to_path)
+            return 0
+
+        if self.rate_limiter:
+            self.rate_limiter.wait(FILE, from_url)
+
+        written = 0
 
-            with to_path.open('wb') as file:
-                for byte in stream.iter_bytes():
-                    file.write(byte)
+        with metrics.measure(
+                'download_file', self.module_name, url_host(from_url),
+                ) as measurement:
+
+            with self.client.stream(
+                    'GET', from_url,
+                    headers=download.request_headers()) as stream:
+                ic(stream)
+                measurement.status = stream.status_code
+
+                if download.accept(stream):
+                    with download.open() as file:
+                        for chunk in stream.iter_bytes(
+                                self.write_options.chunk_size):
+                            written += file.write(chunk)
+
+            measurement.bytes = written
+
+        download.finish()
+
+        if self.dedup:
+            self.dedup.add(download.digest, to_path)
+
+        if self.index:
+            self.index.complete(to_path, download.digest)
 
         ic(success_message)
+        return written
 
-    def _write_text(self, text: str, to_path: Path):
+    def _write_text(self, text: str, to_path: Path) -> int:
         
         success_message = BASE_SUCCESS_MESSAGE.format('Text', to_path)
 
-        with to_path.open('w', encoding='UTF-8') as file:
-            file.write(text)
+        with metrics.measure('write_text', self.module_name) as measurement:
+
+            with to_path.open('w', encoding='UTF-8') as file:
+                file.write(text)
+
+            measurement.bytes = len(text.encode('UTF-8'))
 
         ic(success_message)
+        return measurement.bytes
 
 
 def get_api(
         api_class: Callable[[], ScrapperApi],
         headers: dict = {}, cookies: dict = {},
+        rate_limits: RateLimits | None = None,
         ) -> ScrapperApi:
     
     
-    client = httpx.Client(
-        headers=BASE_HEADERS | headers, cookies=cookies,
-        follow_redirects=True)
+    client = client_factory.create_client(BASE_HEADERS | headers, cookies)
     
     api = api_class(client)
+
+    if rate_limits:
+        api.rate_limiter = RateLimiter(rate_limits)
     
     return api
 
@@ -205,6 +457,7 @@ __all__ = [
     'DownloadUnit',
     'BasicPackage',
     'AuthorPackage',
+    'CollectionPackage',
     'DownloadPackage',
     'ScrapperApi',
     'construct_package_name',
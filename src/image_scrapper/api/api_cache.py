@@ -0,0 +1,211 @@
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock, get_ident
+from typing import Callable
+
+import httpx
+
+from image_scrapper.constants.network import HTTP_CACHE_MAX_SIZE, HTTP_CACHE_TTL
+from image_scrapper.constants.paths import HTTP_CACHE
+
+# Request headers which change page contents.
+# Cookies are left out: sites refresh them on almost every response
+KEY_HEADERS = ('accept', 'accept-language', 'authorization')
+
+# Stored body is already decoded
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding')
+
+
+def _temp_path(path: Path) -> Path:
+    """Unique file to write before atomically replacing path"""
+    return path.with_name(f'{path.name}.{os.getpid()}-{get_ident()}.tmp')
+
+
+class ResponseCache:
+    """On-disk cache of GET responses revalidated with conditional requests.
+
+    Entry is stored as two files: [key].json with response metadata and
+    [key].body with response contents. Fresh entries (younger than ttl)
+    are returned without any request. Older ones are revalidated using
+    ETag/Last-Modified and are reused if server responds with 304.
+
+    Args:
+        path: cache directory [Path] (Default: HTTP_CACHE)
+        ttl: seconds entry is used without revalidation [float] (Default: HTTP_CACHE_TTL)
+        max_size: cache size limit in bytes [int] (Default: HTTP_CACHE_MAX_SIZE)
+    """
+
+    def __init__(
+            self, path: Path = HTTP_CACHE,
+            ttl: float = HTTP_CACHE_TTL,
+            max_size: int = HTTP_CACHE_MAX_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.max_size = max_size
+
+        self._lock = Lock()
+        # key -> entry size, least recently used first
+        self._entries: OrderedDict[str, int] | None = None
+        self._size = 0
+
+    def get(
+            self, client: httpx.Client, url: str,
+            before_send: Callable[[], None] | None = None) -> httpx.Response:
+        """Sends GET request through client unless cached page is still valid.
+
+        Args:
+            before_send: called only if request is sent, e.g. to wait
+                for rate limiter [Callable|None] (Default: None)
+        """
+
+        request = client.build_request('GET', url)
+        key = self._key(request)
+
+        meta = self._read_meta(key)
+
+        if meta and time.time() - meta['stored_at'] < self.ttl:
+            return self._cached_response(key, meta)
+
+        if meta:
+            if etag := meta['headers'].get('etag'):
+                request.headers['if-none-match'] = etag
+            if last_modified := meta['headers'].get('last-modified'):
+                request.headers['if-modified-since'] = last_modified
+
+        if before_send:
+            before_send()
+
+        response = client.send(request)
+
+        if response.status_code == 304 and meta:
+            meta['stored_at'] = time.time()
+            self._write_meta(key, meta)
+            return self._cached_response(key, meta)
+
+        if response.status_code == 200:
+            self._store(key, response)
+
+        return response
+
+    # ^ ---- Entry files
+
+    def _key(self, request: httpx.Request) -> str:
+
+        key_parts = [str(request.url)] + [
+            request.headers.get(header, '') for header in KEY_HEADERS
+        ]
+        return hashlib.sha256('\n'.join(key_parts).encode()).hexdigest()
+
+    def _meta_path(self, key: str) -> Path:
+        return self.path / f'{key}.json'
+
+    def _body_path(self, key: str) -> Path:
+        return self.path / f'{key}.body'
+
+    def _read_meta(self, key: str) -> dict | None:
+        try:
+            with self._meta_path(key).open(encoding='UTF-8') as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _write_meta(self, key: str, meta: dict):
+
+        meta_path = self._meta_path(key)
+        temp_path = _temp_path(meta_path)
+
+        with temp_path.open('w', encoding='UTF-8') as file:
+            json.dump(meta, file)
+
+        os.replace(temp_path, meta_path)
+
+    def _cached_response(self, key: str, meta: dict) -> httpx.Response:
+
+        try:
+            content = self._body_path(key).read_bytes()
+        except FileNotFoundError:
+            content = b''
+
+        self._touch(key)
+
+        return httpx.Response(
+            meta['status_code'],
+            headers=meta['headers'],
+            content=content,
+            request=httpx.Request('GET', meta['url']),
+        )
+
+    def _store(self, key: str, response: httpx.Response):
+
+        self.path.mkdir(parents=True, exist_ok=True)
+
+        headers = {
+            name: value for name, value in response.headers.items()
+                if name not in DROPPED_HEADERS
+        }
+        meta = {
+            'url': str(response.url),
+            'status_code': response.status_code,
+            'headers': headers,
+            'stored_at': time.time(),
+        }
+
+        body_path = self._body_path(key)
+        temp_path = _temp_path(body_path)
+        temp_path.write_bytes(response.content)
+        os.replace(temp_path, body_path)
+
+        self._write_meta(key, meta)
+
+        self._add_entry(key, len(response.content))
+
+    # ^ ---- Size limit
+
+    def _load_entries(self):
+        """Builds LRU index from files left by previous runs"""
+
+        body_paths = sorted(
+            self.path.glob('*.body'), key=lambda path: path.stat().st_mtime)
+
+        self._entries = OrderedDict(
+            (path.stem, path.stat().st_size) for path in body_paths)
+        self._size = sum(self._entries.values())
+
+    def _touch(self, key: str):
+
+        with self._lock:
+            if self._entries is None:
+                self._load_entries()
+
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+        body_path = self._body_path(key)
+        if body_path.exists():
+            os.utime(body_path)
+
+    def _add_entry(self, key: str, size: int):
+
+        with self._lock:
+            if self._entries is None:
+                self._load_entries()
+
+            self._size += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+
+            while self._size > self.max_size and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._size -= old_size
+
+                self._meta_path(old_key).unlink(missing_ok=True)
+                self._body_path(old_key).unlink(missing_ok=True)
+
+
+__all__ = [
+    'ResponseCache',
+]
@@ -0,0 +1,148 @@
+
+import asyncio
+import importlib.util
+from dataclasses import dataclass
+from threading import Lock, Thread
+
+import httpx
+from icecream import ic
+
+from image_scrapper.constants.network import (
+    HTTP2,
+    POOL_KEEPALIVE_EXPIRY, POOL_MAX_CONNECTIONS, POOL_MAX_KEEPALIVE,
+    TIMEOUT_CONNECT, TIMEOUT_POOL, TIMEOUT_READ, TIMEOUT_WRITE,
+)
+
+# % From stackoverflow to prevent ssl dh key too small error
+httpx._config.DEFAULT_CIPHERS += ":ALL:@SECLEVEL=1"
+
+
+@dataclass
+class ClientFactory:
+    """Creates http clients sharing one connection pool.
+
+    Every module gets its own client (with own headers and cookies), but all
+    clients send requests through the same transport, so connections to a
+    host (e.g. image CDN) are reused by every module and package.
+
+    Async clients are bound to a single background event loop, which is
+    shared by all async downloads for the same reason.
+    """
+
+    max_connections: int = POOL_MAX_CONNECTIONS
+    max_keepalive: int = POOL_MAX_KEEPALIVE
+    keepalive_expiry: float = POOL_KEEPALIVE_EXPIRY
+
+    connect_timeout: float = TIMEOUT_CONNECT
+    read_timeout: float = TIMEOUT_READ
+    write_timeout: float = TIMEOUT_WRITE
+    pool_timeout: float = TIMEOUT_POOL
+
+    http2: bool = HTTP2
+
+    def __post_init__(self):
+        self._lock = Lock()
+        self._transport: httpx.HTTPTransport | None = None
+        self._async_transport: httpx.AsyncHTTPTransport | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._host_limits: dict[str, asyncio.Semaphore] = {}
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout,
+        )
+
+    def use_transports(
+            self, transport: httpx.BaseTransport,
+            async_transport: httpx.AsyncBaseTransport):
+        """Replaces shared transports (e.g. to route requests to local
+        server in benchmarks). Affects clients created after the call."""
+
+        with self._lock:
+            self._transport = transport
+            self._async_transport = async_transport
+
+    def create_client(
+            self, headers: dict = {}, cookies: dict = {}) -> httpx.Client:
+
+        with self._lock:
+            if not self._transport:
+                self._transport = httpx.HTTPTransport(
+                    http2=self._use_http2(), limits=self.limits)
+
+        return httpx.Client(
+            headers=headers, cookies=cookies,
+            follow_redirects=True, timeout=self.timeout,
+            transport=self._transport,
+        )
+
+    def create_async_client(
+            self, headers: dict = {}, cookies: dict = {}) -> httpx.AsyncClient:
+        """Creates async client. Must be used in loop from [get_loop]."""
+
+        with self._lock:
+            if not self._async_transport:
+                self._async_transport = httpx.AsyncHTTPTransport(
+                    http2=self._use_http2(), limits=self.limits)
+
+        # Client must not be closed, as closing closes shared transport
+        return httpx.AsyncClient(
+            headers=headers, cookies=cookies,
+            follow_redirects=True, timeout=self.timeout,
+            transport=self._async_transport,
+        )
+
+    def _use_http2(self) -> bool:
+        """Checked when transport is created, as http2 may be enabled
+        after factory is created (e.g. by --http2)"""
+
+        if self.http2 and not importlib.util.find_spec('h2'):
+            ic('HTTP/2 requires h2 package, using HTTP/1.1')
+            self.http2 = False
+
+        return self.http2
+
+    def host_limit(self, host: str, workers: int) -> asyncio.Semaphore:
+        """Limit of parallel downloads from host, shared by all async
+        engines (packages). Number of workers is set by the first engine
+        downloading from host. Must be used in loop from [get_loop]."""
+
+        with self._lock:
+            if host not in self._host_limits:
+                self._host_limits[host] = asyncio.Semaphore(workers)
+
+            return self._host_limits[host]
+
+    def get_loop(self) -> asyncio.AbstractEventLoop:
+        """Background event loop running all async downloads"""
+
+        with self._lock:
+            if not self._loop:
+                self._loop = asyncio.new_event_loop()
+                Thread(
+                    target=self._loop.run_forever,
+                    name='image_scrapper-async', daemon=True,
+                ).start()
+
+        return self._loop
+
+
+client_factory = ClientFactory()
+
+
+__all__ = [
+    'ClientFactory',
+    'client_factory',
+]
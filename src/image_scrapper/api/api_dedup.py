@@ -0,0 +1,127 @@
+
+import os
+import sqlite3
+from pathlib import Path
+from threading import Lock
+
+from icecream import ic
+
+from image_scrapper.constants.paths import DEDUP_INDEX
+
+try:
+    import fcntl
+except ImportError:
+    # Windows, reflinks are not supported
+    fcntl = None
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+LINK_MODES = ('hardlink', 'reflink')
+
+
+class DedupStore:
+    """Content-addressed index of downloaded files.
+
+    Every finished file is recorded by its sha256. When a file with known
+    contents is downloaded again (to a different path), it is replaced
+    by a link to the first copy, so identical images are stored once.
+
+    Args:
+        index_path: sqlite database with file hashes [Path] (Default: DEDUP_INDEX)
+        link_mode: "hardlink" or "reflink" (copy-on-write clone, Linux only).
+            If link can't be created file is kept as separate copy [str]
+    """
+
+    def __init__(
+            self, index_path: Path = DEDUP_INDEX,
+            link_mode: str = 'hardlink'):
+
+        if link_mode not in LINK_MODES:
+            raise ValueError(f'Unknown link mode: {link_mode}')
+
+        self.link_mode = link_mode
+
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS files ('
+            'path TEXT PRIMARY KEY, hash TEXT NOT NULL, size INTEGER NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS files_hash ON files (hash)')
+        self._db.commit()
+        self._lock = Lock()
+
+    def add(self, digest: str, path: Path) -> bool:
+        """Records downloaded file. Returns True if file was deduplicated."""
+
+        path = path.absolute()
+        size = path.stat().st_size
+
+        with self._lock:
+            original = self._find_copy(digest, size, path)
+
+            linked = bool(original) and self._link(original, path)
+
+            self._db.execute(
+                'INSERT OR REPLACE INTO files VALUES (?, ?, ?)',
+                (str(path), digest, size))
+            self._db.commit()
+
+        if linked:
+            ic(f'Deduplicated: {path} -> {original}')
+
+        return linked
+
+    def _find_copy(self, digest: str, size: int, path: Path) -> Path | None:
+        """Finds existing file with same contents"""
+
+        rows = self._db.execute(
+            'SELECT path FROM files WHERE hash = ? AND size = ? AND path != ?',
+            (digest, size, str(path)))
+
+        for (other_path,) in rows:
+            other_path = Path(other_path)
+
+            # Files may be moved or removed by user
+            if other_path.exists() and other_path.stat().st_size == size:
+                return other_path
+
+        return None
+
+    def _link(self, original: Path, path: Path) -> bool:
+
+        if os.path.samefile(original, path):
+            return True
+
+        temp_path = path.with_name(path.name + '.link')
+        temp_path.unlink(missing_ok=True)
+
+        try:
+            if self.link_mode == 'hardlink':
+                os.link(original, temp_path)
+            else:
+                _reflink(original, temp_path)
+        except OSError as error:
+            # E.g. files are on different file systems
+            ic(f'Unable to link {path}: {error!r}')
+            temp_path.unlink(missing_ok=True)
+            return False
+
+        os.replace(temp_path, path)
+        return True
+
+
+def _reflink(source: Path, target: Path):
+
+    if not fcntl:
+        raise OSError('Reflinks are not supported on this system')
+
+    with source.open('rb') as source_file, target.open('wb') as target_file:
+        fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+
+
+__all__ = [
+    'DedupStore',
+]
@@ -0,0 +1,217 @@
+
+import asyncio
+from pathlib import Path
+from threading import Thread
+from typing import TYPE_CHECKING, Iterable
+
+import httpx
+from icecream import ic
+
+from image_scrapper.constants.network import PIPELINE_QUEUE_SIZE
+from image_scrapper.helpers import metrics, retry_times, url_host
+
+from .api_client import client_factory
+from .api_ratelimit import FILE
+from .api_storage import PartialDownload, ensure_parent_dir
+
+if TYPE_CHECKING:
+    from .api_base import DownloadUnit, ScrapperApi
+
+BASE_SUCCESS_MESSAGE = '{} download finished: {}!'
+
+
+class AsyncEngine:
+    """Downloads units of a package concurrently using httpx.AsyncClient.
+
+    Units are consumed as a pipeline: package contents are iterated in a
+    separate thread and resolved units are passed to download workers
+    through a bounded queue. Downloads start as soon as the first unit is
+    known and memory usage does not depend on package size.
+
+    Uses headers and cookies of the api's sync client, so files are
+    requested exactly as the sync downloader would request them.
+
+    Args:
+        api: api which package is being downloaded [ScrapperApi]
+        workers: maximum number of parallel downloads [int]
+        host_workers: maximum number of parallel downloads per host,
+            shared by all engines [int]
+        queue_size: maximum number of resolved units waiting for download [int]
+    """
+
+    def __init__(
+            self, api: 'ScrapperApi', workers: int, host_workers: int,
+            queue_size: int = PIPELINE_QUEUE_SIZE):
+        self.api = api
+        self.workers = workers
+        self.host_workers = host_workers
+        self.queue_size = queue_size
+
+    def download(self, units: Iterable['DownloadUnit']) -> int:
+        """Downloads all units. Returns number of bytes written."""
+        # All engines share one event loop, and so its connection pool
+        loop = client_factory.get_loop()
+        return asyncio.run_coroutine_threadsafe(
+            self._download_units(units), loop).result()
+
+    async def _download_units(self, units: Iterable['DownloadUnit']) -> int:
+
+        queue = asyncio.Queue(self.queue_size)
+
+        # Failed unit does not stop the pipeline: everything resolved
+        # is still downloaded, then the first error is raised
+        errors: list[Exception] = []
+        written = 0
+
+        loop = asyncio.get_running_loop()
+
+        def put(unit: 'DownloadUnit | None'):
+            asyncio.run_coroutine_threadsafe(queue.put(unit), loop).result()
+
+        def produce():
+            # Package contents may send requests or wait (e.g. gallery
+            # image pages, ugoira conversion) while being iterated. Each
+            # engine iterates in its own thread, so a slow package does
+            # not hold threads shared with other packages
+            created_dirs: set[Path] = set()
+
+            try:
+                for unit in units:
+                    ensure_parent_dir(unit.file_path, created_dirs)
+                    put(unit)
+            except Exception as error:
+                # Units after it are missing, so it is raised first
+                errors.insert(0, error)
+            finally:
+                for _ in range(self.workers):
+                    put(None)
+
+        async def consume():
+            nonlocal written
+
+            while (unit := await queue.get()) is not None:
+                try:
+                    # Await before adding: other consumers update written
+                    # while this one waits
+                    unit_written = await process(unit)
+                    written += unit_written
+                except Exception as error:
+                    ic(f'Failed to download {unit.file_path}: {error!r}')
+                    errors.append(error)
+
+                    if self.api.index and unit.kind == 'file':
+                        await asyncio.to_thread(
+                            self.api.index.fail, unit.file_path, error)
+
+        async def process(unit: 'DownloadUnit') -> int:
+
+            if unit.kind == 'text':
+                return await asyncio.to_thread(
+                    self.api._write_text, unit.contents, unit.file_path)
+
+            if unit.kind == 'file':
+                host = httpx.URL(unit.contents).host
+
+                async with client_factory.host_limit(host, self.host_workers):
+                    return await self._download_file(
+                        client, unit.contents, unit.file_path)
+
+            return 0
+
+        sync_client = self.api.client
+
+        client = client_factory.create_async_client(
+            sync_client.headers, sync_client.cookies)
+
+        Thread(
+            target=produce, name='image_scrapper-producer', daemon=True,
+        ).start()
+
+        await asyncio.gather(*(consume() for _ in range(self.workers)))
+
+        if errors:
+            raise errors[0]
+
+        return written
+
+    @retry_times()
+    async def _download_file(
+            self, client: httpx.AsyncClient, from_url: str, to_path: Path,
+            ) -> int:
+        """Downloads one file. Resumes partially downloaded file.
+
+        Returns number of bytes received."""
+
+        success_message = BASE_SUCCESS_MESSAGE.format('File', to_path)
+
+        download = PartialDownload(
+            to_path, hashed=bool(self.api.dedup or self.api.index),
+            options=self.api.write_options)
+
+        if download.is_complete():
+            ic(f'Skipping downloaded file: {to_path}')
+            if self.api.index:
+                await asyncio.to_thread(self.api.index.complete, to_path)
+            return 0
+
+        if self.api.rate_limiter:
+            await self.api.rate_limiter.async_wait(FILE, from_url)
+
+        written = 0
+
+        with metrics.measure(
+                'download_file', self.api.module_name, url_host(from_url),
+                ) as measurement:
+
+            async with client.stream(
+                    'GET', from_url,
+                    headers=download.request_headers()) as stream:
+                ic(stream)
+                measurement.status = stream.status_code
+
+                if download.accept(stream):
+                    written = await self._write_stream(download, stream)
+
+            measurement.bytes = written
+
+        # Disk operations (fsync, rename, hashing, index updates) may be
+        # slow on network storage and must not pause other transfers
+        await asyncio.to_thread(self._finish_file, download)
+
+        ic(success_message)
+        return written
+
+    async def _write_stream(
+            self, download: PartialDownload, stream: httpx.Response) -> int:
+        """Writes response body to part file. Writes (which flush write
+        buffer and hash data) are done in threads, off the event loop."""
+
+        file = await asyncio.to_thread(download.open)
+        written = 0
+        success = False
+
+        try:
+            async for chunk in stream.aiter_bytes(
+                    self.api.write_options.chunk_size):
+                written += await asyncio.to_thread(file.write, chunk)
+            success = True
+        finally:
+            await asyncio.to_thread(file.close, success)
+
+        return written
+
+    def _finish_file(self, download: PartialDownload):
+
+        download.finish()
+
+        if self.api.dedup:
+            self.api.dedup.add(download.digest, download.path)
+
+        if self.api.index:
+            self.api.index.complete(download.path, download.digest)
+
+
+__all__ = [
+    'AsyncEngine',
+    'BASE_SUCCESS_MESSAGE',
+]
@@ -0,0 +1,128 @@
+
+import re
+from functools import lru_cache
+from typing import Iterable, Iterator, Mapping, Protocol
+
+import lxml.html
+from bs4 import BeautifulSoup as bs
+from icecream import ic
+from lxml import etree
+
+try:
+    from cssselect import HTMLTranslator
+except ImportError:
+    # lxml can't translate css selectors without cssselect
+    HTMLTranslator = None
+    ic('lxml backend requires cssselect package, parsing with BeautifulSoup')
+
+BACKENDS = ('lxml', 'soup')
+
+DEFAULT_BACKEND = 'lxml' if HTMLTranslator else 'soup'
+
+# Contents of these tags are not page text (same as in BeautifulSoup)
+NON_TEXT_TAGS = frozenset(('script', 'style', 'template'))
+
+# lxml refuses decoded text declaring its encoding (e.g. xhtml pages)
+XML_DECLARATION_REGEX = re.compile(r'^\s*<\?xml[^>]*\?>')
+
+
+class Node(Protocol):
+    """Html element interface shared by all extraction backends.
+
+    Mirrors the part of BeautifulSoup Tag api used by modules."""
+
+    @property
+    def text(self) -> str: ...
+
+    @property
+    def attrs(self) -> Mapping[str, str]: ...
+
+    @property
+    def strings(self) -> Iterable[str]: ...
+
+    def select(self, selector: str) -> list['Node']: ...
+
+    def select_one(self, selector: str) -> 'Node | None': ...
+
+
+@lru_cache(maxsize=None)
+def compile_selector(selector: str) -> etree.XPath:
+    """Translates css selector to compiled xpath. Cached, as modules
+    use the same few selectors for every page."""
+    return etree.XPath(HTMLTranslator().css_to_xpath(selector))
+
+
+class LxmlNode:
+    """lxml.html element with BeautifulSoup-like api"""
+
+    __slots__ = ('element',)
+
+    def __init__(self, element: lxml.html.HtmlElement):
+        self.element = element
+
+    @property
+    def text(self) -> str:
+        return ''.join(self.strings)
+
+    @property
+    def attrs(self) -> Mapping[str, str]:
+        return self.element.attrib
+
+    @property
+    def strings(self) -> Iterator[str]:
+
+        for element in self.element.iter():
+
+            # Comments and processing instructions have non-string tags
+            if (isinstance(element.tag, str)
+                    and element.tag not in NON_TEXT_TAGS and element.text):
+                yield element.text
+
+            if element is not self.element and element.tail:
+                yield element.tail
+
+    def select(self, selector: str) -> list['LxmlNode']:
+        return [
+            LxmlNode(element)
+                for element in compile_selector(selector)(self.element)
+        ]
+
+    def select_one(self, selector: str) -> 'LxmlNode | None':
+
+        elements = compile_selector(selector)(self.element)
+
+        return LxmlNode(elements[0]) if elements else None
+
+
+def parse_html(markup: str, backend: str | None = None) -> Node:
+    """Parses html document.
+
+    Args:
+        markup: html text [str]
+        backend: "lxml" (fast, requires cssselect) or "soup" (BeautifulSoup)
+            [str] (Default: DEFAULT_BACKEND)
+    """
+
+    backend = backend or DEFAULT_BACKEND
+
+    if backend == 'lxml':
+        markup = XML_DECLARATION_REGEX.sub('', markup, count=1)
+        return LxmlNode(lxml.html.document_fromstring(markup))
+
+    if backend == 'soup':
+        return bs(markup, 'lxml')
+
+    raise ValueError(f'Unknown extraction backend: {backend}')
+
+
+def select_attr(markup: str, selector: str, attr: str) -> str:
+    """Attribute of the first element matching selector. Extractor
+    for ScrapperApi.extract."""
+    return parse_html(markup).select_one(selector).attrs[attr]
+
+
+__all__ = [
+    'Node',
+    'parse_html',
+    'select_attr',
+]
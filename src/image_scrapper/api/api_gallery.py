@@ -6,15 +6,20 @@ from typing import Iterable
 from string import Template
 
 import httpx
-from bs4 import BeautifulSoup as bs
 from icecream import ic
 
-from image_scrapper.helpers import extract_file_extension
+from image_scrapper.constants.network import RESOLVE_WORKERS
+from image_scrapper.helpers import (
+    canonicalize_url, extract_file_extension, ordered_map
+)
 
 from .api_base import (
-    BasicPackage, DownloadUnit, ScrapperApi,
+    BASE_HEADERS, BasicPackage, DownloadUnit, ScrapperApi,
     construct_package_name
 )
+from .api_client import client_factory
+from .api_extract import Node, parse_html, select_attr
+from .api_ratelimit import RateLimiter, RateLimits
 
 
 ID_REGEX = re.compile('\/([0-9]+)\/')
@@ -32,6 +37,9 @@ class GalleryParseParams:
     download_dir: str
     template_url: Template|None = None
 
+    # Number of image pages fetched in parallel
+    resolve_workers: int = RESOLVE_WORKERS
+
     @property
     def headers_selectors(self):
         return self.title_header_selector, self.page_count_selector
@@ -44,7 +52,8 @@ class GalleryParseParams:
 @dataclass
 class GalleryPackage(BasicPackage):
     
-    image_urls: list
+    # May be a lazy iterator, resolved while package is being downloaded
+    image_urls: Iterable[str]
     download_dir: Path
 
     @property
@@ -68,58 +77,56 @@ class GalleryApi(ScrapperApi):
 
     parse_params: GalleryParseParams = None
 
-    def get_gallery_meta(self, soup: bs, gallery_url: str) -> tuple[str, str, int]:
-        
-        title_selector, count_selector = self.parse_params.headers_selectors
-        
-        gallery_id = ID_REGEX.search(gallery_url)[1]
-
-        gallery_title = soup.select_one(title_selector).text
-        page_count = int(PAGE_COUNT_REGEX.search(
-            soup.select_one(count_selector).text)[0])
+    def canonical_url(self, url: str) -> str:
+        # Query only selects index page, whole gallery is downloaded anyway
+        return canonicalize_url(url, keep_query=False)
 
-        return gallery_id, gallery_title, page_count
+    def get_gallery_meta(self, soup: Node, gallery_url: str) -> tuple[str, str, int]:
+        return gallery_meta(soup, self.parse_params, gallery_url)
     
     # May be redefined
     def generate_page_urls(
-            self, page_count: int) -> list[str]:
+            self, gallery_url: str, page_count: int) -> list[str]:
         
         url_template = self.parse_params.template_url
+        gallery_id = ID_REGEX.search(gallery_url)[1]
         
         for i in range(1, page_count+1):
-            yield url_template.safe_substitute({'page_n': i})
+            yield url_template.safe_substitute(
+                {'gal_id': gallery_id, 'page_n': i})
+
+    def parse_page_url(self, page_url: str) -> str:
+        """Gets full image url from single image page"""
+
+        page_res = self.get(page_url)
+
+        selector, tag_attr = self.parse_params.big_img_selectors
+        return self.extract(select_attr, page_res, selector, tag_attr)
 
     def parse_page_urls(
             self, page_urls: list[str]) -> list[str]:
-        
-        for i, url in enumerate(page_urls, 1):
+        """Resolves image pages in parallel. Keeps page order."""
 
-            page_res = self.get(url)
-            soup = bs(page_res.text, 'lxml')
+        image_urls = ordered_map(
+            self.parse_page_url, page_urls,
+            workers=self.parse_params.resolve_workers,
+        )
 
-            selector, tag_attr = self.parse_params.big_img_selectors
-            image_url = soup.select_one(selector).attrs[tag_attr]
+        for i, image_url in enumerate(image_urls, 1):
             ic(f'Got image {i}')
-
             yield image_url
 
 
     def parse(self, response: httpx.Response) -> GalleryPackage:
         
-        soup = bs(response.text, 'lxml')
+        gallery_url = str(response.url)
 
-        gallery_id, title, page_count = self.get_gallery_meta(
-            soup, str(response.url)
-        )
-        
-        if template := self.parse_params.template_url:
-            self.parse_params.template_url = \
-                Template(template.safe_substitute(
-                    {'gal_id': gallery_id}
-                ))
+        gallery_id, title, page_count = self.extract(
+            _extract_gallery_meta, response, self.parse_params, gallery_url)
 
-        image_page_urls = list(self.generate_page_urls(page_count))
-        image_urls = list(self.parse_page_urls(image_page_urls))
+        # Image urls are resolved lazily, while files are downloaded
+        image_page_urls = self.generate_page_urls(gallery_url, page_count)
+        image_urls = self.parse_page_urls(image_page_urls)
 
         download_dir = self.parse_params.download_dir
 
@@ -127,14 +134,44 @@ class GalleryApi(ScrapperApi):
             gallery_id, title, image_urls, download_dir)
     
 
-def get_gallery_api(parse_params: GalleryParseParams) -> GalleryApi:
-    client = httpx.Client()
-    return GalleryApi(client, parse_params)
+def gallery_meta(
+        soup: Node, parse_params: GalleryParseParams,
+        gallery_url: str) -> tuple[str, str, int]:
+    """Id, title and page count of gallery page"""
+
+    title_selector, count_selector = parse_params.headers_selectors
+
+    gallery_id = ID_REGEX.search(gallery_url)[1]
+
+    gallery_title = soup.select_one(title_selector).text
+    page_count = int(PAGE_COUNT_REGEX.search(
+        soup.select_one(count_selector).text)[0])
+
+    return gallery_id, gallery_title, page_count
+
+def _extract_gallery_meta(
+        markup: str, parse_params: GalleryParseParams,
+        gallery_url: str) -> tuple[str, str, int]:
+    return gallery_meta(parse_html(markup), parse_params, gallery_url)
+
+def get_gallery_api(
+        parse_params: GalleryParseParams,
+        rate_limits: RateLimits | None = None,
+        ) -> GalleryApi:
+
+    client = client_factory.create_client(BASE_HEADERS)
+    api = GalleryApi(client, parse_params)
+
+    if rate_limits:
+        api.rate_limiter = RateLimiter(rate_limits)
+
+    return api
 
 
 __all__ = [
     'GalleryApi',
     'GalleryPackage',
     'GalleryParseParams',
+    'gallery_meta',
     'get_gallery_api'
 ]
\ No newline at end of file
@@ -0,0 +1,217 @@
+
+import atexit
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Iterable, Iterator
+
+from icecream import ic
+
+from image_scrapper.constants.paths import DOWNLOAD_INDEX
+from image_scrapper.constants.storage import (
+    INDEX_COMMIT_EVERY, INDEX_COMMIT_INTERVAL)
+
+if TYPE_CHECKING:
+    from .api_base import DownloadPackage, DownloadUnit
+
+# Unit statuses
+PENDING = 'pending'
+COMPLETE = 'complete'
+FAILED = 'failed'
+
+
+@dataclass
+class IndexEntry:
+    """Indexed file unit"""
+
+    path: str
+    unit_url: str
+    source_url: str
+    package_id: str | None
+    module: str
+    size: int | None
+    hash: str | None
+    status: str
+    error: str | None
+    updated: str
+
+
+class DownloadIndex:
+    """Index of downloaded files.
+
+    Every file unit is recorded with url of page it was found on, its
+    package and module, before it is downloaded. Finished files get
+    their size and hash (if dedup or index hashing is enabled), failed
+    ones get the error. Units recorded as complete are skipped without
+    touching the file system.
+
+    Text units are cheap to write and are not indexed.
+
+    Updates are committed in batches, so workers don't wait for a commit
+    per unit. Uncommitted updates are still seen by the index itself.
+
+    Args:
+        index_path: sqlite database [Path] (Default: DOWNLOAD_INDEX)
+        commit_every: updates committed together [int] (Default: INDEX_COMMIT_EVERY)
+        commit_interval: longest time updates stay uncommitted in seconds
+            [float] (Default: INDEX_COMMIT_INTERVAL)
+    """
+
+    def __init__(
+            self, index_path: Path = DOWNLOAD_INDEX,
+            commit_every: int = INDEX_COMMIT_EVERY,
+            commit_interval: float = INDEX_COMMIT_INTERVAL):
+
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(index_path, check_same_thread=False)
+
+        # Single writer with many short transactions
+        self._db.execute('PRAGMA journal_mode = WAL')
+        self._db.execute('PRAGMA synchronous = NORMAL')
+
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS units ('
+            'path TEXT PRIMARY KEY, unit_url TEXT NOT NULL, '
+            'source_url TEXT NOT NULL, package_id TEXT, module TEXT NOT NULL, '
+            'size INTEGER, hash TEXT, status TEXT NOT NULL, error TEXT, '
+            'updated TEXT NOT NULL)'
+        )
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS units_status ON units (status)')
+        self._db.execute(
+            'CREATE INDEX IF NOT EXISTS units_url ON units (unit_url)')
+        self._db.commit()
+        self._lock = Lock()
+
+        self._uncommitted = 0
+        self._committed_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def track(
+            self, units: Iterable[tuple['DownloadPackage', 'DownloadUnit']],
+            source_url: str, module: str) -> Iterator['DownloadUnit']:
+        """Records file units as pending, skips complete ones.
+
+        Args:
+            units: package contents with package of each unit
+            source_url: url package was downloaded from [str]
+            module: module name [str]
+        """
+
+        for package, unit in units:
+
+            if unit.kind != 'file':
+                yield unit
+                continue
+
+            if self.is_complete(unit.file_path):
+                ic(f'Skipping indexed file: {unit.file_path}')
+                continue
+
+            self._execute(
+                'INSERT INTO units '
+                '(path, unit_url, source_url, package_id, module, status, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (path) DO UPDATE SET '
+                'unit_url = excluded.unit_url, source_url = excluded.source_url, '
+                'package_id = excluded.package_id, module = excluded.module, '
+                'size = NULL, hash = NULL, status = excluded.status, '
+                'error = NULL, updated = excluded.updated',
+                (_key(unit.file_path), unit.contents, source_url,
+                 _package_id(package), module, PENDING, _now()),
+            )
+
+            yield unit
+
+    def is_complete(self, path: Path) -> bool:
+
+        with self._lock:
+            row = self._db.execute(
+                'SELECT 1 FROM units WHERE path = ? AND status = ?',
+                (_key(path), COMPLETE)).fetchone()
+
+        return row is not None
+
+    def complete(self, path: Path, digest: str | None = None):
+        """Records finished file"""
+
+        self._execute(
+            'UPDATE units SET status = ?, size = ?, hash = ?, error = NULL, '
+            'updated = ? WHERE path = ?',
+            (COMPLETE, path.stat().st_size, digest, _now(), _key(path)),
+        )
+
+    def fail(self, path: Path, error: Exception):
+        """Records failed file"""
+
+        self._execute(
+            'UPDATE units SET status = ?, error = ?, updated = ? '
+            'WHERE path = ?',
+            (FAILED, repr(error), _now(), _key(path)),
+        )
+
+    def entries(
+            self, statuses: Iterable[str] = (PENDING, FAILED),
+            ) -> Iterator[IndexEntry]:
+        """Indexed units with given statuses. By default units which are
+        not downloaded: failed ones and ones left by interrupted runs."""
+
+        statuses = tuple(statuses)
+        placeholders = ', '.join('?' * len(statuses))
+
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT path, unit_url, source_url, package_id, module, '
+                'size, hash, status, error, updated FROM units '
+                f'WHERE status IN ({placeholders}) ORDER BY updated',
+                statuses).fetchall()
+
+        for row in rows:
+            yield IndexEntry(*row)
+
+    def flush(self):
+        """Commits pending updates"""
+
+        with self._lock:
+            self._commit()
+
+    def _execute(self, query: str, params: tuple):
+
+        with self._lock:
+            self._db.execute(query, params)
+            self._uncommitted += 1
+
+            if (self._uncommitted >= self.commit_every
+                    or time.monotonic() - self._committed_at
+                        >= self.commit_interval):
+                self._commit()
+
+    def _commit(self):
+
+        if self._uncommitted:
+            self._db.commit()
+            self._uncommitted = 0
+
+        self._committed_at = time.monotonic()
+
+
+def _key(path: Path) -> str:
+    return str(path.absolute())
+
+def _package_id(package: 'DownloadPackage') -> str | None:
+    package_id = getattr(package, 'id', None)
+    return None if package_id is None else str(package_id)
+
+def _now() -> str:
+    return time.strftime('%Y-%m-%dT%H:%M:%S')
+
+
+__all__ = [
+    'DownloadIndex',
+    'IndexEntry',
+]
@@ -0,0 +1,78 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Any, Callable, TypeVar
+
+import httpx
+
+R = TypeVar('R')
+
+# Extraction function: page markup and extra arguments -> small result
+Extractor = Callable[..., R]
+
+
+def _run_extractor(
+        extractor: Extractor, content: bytes, encoding: str | None,
+        args: tuple) -> Any:
+    """Runs in pool process: decodes raw response and extracts from it"""
+
+    markup = content.decode(encoding or 'utf-8', errors='replace')
+    return extractor(markup, *args)
+
+
+class ParsePool:
+    """Process pool for html parsing and extraction.
+
+    Threads fetching pages are bound by GIL while they parse html, so
+    parsing is done in other processes. Raw response bytes are sent to
+    pool and only extracted results (urls, titles) are sent back, parsed
+    documents never leave pool process.
+
+    Extractors must be module level functions (so they can be pickled),
+    taking page markup as first argument.
+
+    Processes are started on first use.
+
+    Args:
+        workers: number of processes [int] (Default: number of cpus)
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workers = workers or multiprocessing.cpu_count()
+        self._executor: ProcessPoolExecutor | None = None
+        self._lock = Lock()
+
+    def extract(
+            self, extractor: Extractor, response: httpx.Response,
+            *args: Any) -> R:
+        """Runs extractor over response in pool process. Blocks calling
+        thread until result is ready."""
+
+        return self._get_executor().submit(
+            _run_extractor, extractor,
+            response.content, response.encoding, args,
+        ).result()
+
+    def close(self):
+        with self._lock:
+            if self._executor:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+
+        with self._lock:
+            if not self._executor:
+                # Forking a process with running threads may copy held
+                # locks, so pool processes are started clean
+                self._executor = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                )
+
+        return self._executor
+
+
+__all__ = [
+    'ParsePool',
+]
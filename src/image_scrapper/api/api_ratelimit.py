@@ -0,0 +1,108 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from threading import Lock
+
+from image_scrapper.helpers import url_host
+
+# Kinds of requests with separate budgets
+PAGE = 'page'
+FILE = 'file'
+
+
+@dataclass(frozen=True)
+class RateLimits:
+    """Request rate limits of a module, per host.
+
+    Pages (html and api requests made with get/post) and files (image
+    downloads, usually from a cdn host) have separate budgets.
+
+    Args:
+        page_rate: page requests per second to a single host.
+            None means unlimited [float|None] (Default: None)
+        file_rate: file downloads per second from a single host [float|None]
+            (Default: None)
+        page_burst: page requests allowed at once after idle time [int]
+            (Default: 1)
+        file_burst: file downloads allowed at once after idle time [int]
+            (Default: 1)
+    """
+
+    page_rate: float | None = None
+    file_rate: float | None = None
+    page_burst: int = 1
+    file_burst: int = 1
+
+    def of(self, kind: str) -> tuple[float | None, int]:
+        if kind == PAGE:
+            return self.page_rate, self.page_burst
+        return self.file_rate, self.file_burst
+
+
+class TokenBucket:
+    """Token bucket shared by threads and coroutines.
+
+    Each request reserves a token, possibly taken in advance,
+    and gets how long it has to wait for it.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """Takes a token. Returns seconds to wait before using it."""
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+            self._tokens -= 1
+            return max(-self._tokens / self.rate, 0.)
+
+
+class RateLimiter:
+    """Gates requests of an api, with one token bucket per host and
+    request kind.
+
+    Args:
+        limits: rates of module [RateLimits]
+    """
+
+    def __init__(self, limits: RateLimits):
+        self.limits = limits
+        self._buckets: dict[tuple[str, str], TokenBucket | None] = {}
+        self._lock = Lock()
+
+    def delay(self, kind: str, url: str) -> float:
+
+        key = kind, url_host(url)
+
+        if key not in self._buckets:
+            with self._lock:
+                if key not in self._buckets:
+                    rate, burst = self.limits.of(kind)
+                    self._buckets[key] = TokenBucket(rate, burst) if rate else None
+
+        bucket = self._buckets[key]
+        return bucket.reserve() if bucket else 0.
+
+    def wait(self, kind: str, url: str):
+        if (delay := self.delay(kind, url)):
+            time.sleep(delay)
+
+    async def async_wait(self, kind: str, url: str):
+        if (delay := self.delay(kind, url)):
+            await asyncio.sleep(delay)
+
+
+__all__ = [
+    'RateLimiter',
+    'RateLimits',
+    'TokenBucket',
+]
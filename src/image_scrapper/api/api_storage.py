@@ -0,0 +1,284 @@
+
+import ctypes
+import hashlib
+import os
+import re
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO
+
+import httpx
+
+from image_scrapper.constants.storage import (
+    FILE_CHUNK_SIZE, FILE_PREALLOCATE, FILE_WRITE_BUFFER, FSYNC_POLICY)
+from image_scrapper.helpers import TransientError
+
+PART_SUFFIX = '.part'
+
+CONTENT_RANGE_REGEX = re.compile(r'bytes (?:(\d+)-\d+|\*)/(\d+|\*)')
+
+# Files are saved byte to byte, so ranges must not be content-encoded
+FILE_REQUEST_HEADERS = {'accept-encoding': 'identity'}
+
+HASH_READ_SIZE = 1024 ** 2
+
+FSYNC_POLICIES = ('never', 'file', 'full')
+
+# linux/falloc.h
+FALLOC_FL_KEEP_SIZE = 0x01
+
+
+class IncompleteDownloadError(TransientError):
+    """Size of downloaded file does not match size announced by server"""
+    ...
+
+
+@dataclass(frozen=True)
+class WriteOptions:
+    """How downloaded files are written.
+
+    Args:
+        chunk_size: size of received chunks in bytes [int] (Default: FILE_CHUNK_SIZE)
+        buffer_size: size of write buffer in bytes [int] (Default: FILE_WRITE_BUFFER)
+        preallocate: reserve disk space for whole file [bool] (Default: FILE_PREALLOCATE)
+        fsync: "never", "file" or "full" (see FSYNC_POLICY) [str] (Default: FSYNC_POLICY)
+    """
+
+    chunk_size: int = FILE_CHUNK_SIZE
+    buffer_size: int = FILE_WRITE_BUFFER
+    preallocate: bool = FILE_PREALLOCATE
+    fsync: str = FSYNC_POLICY
+
+    def __post_init__(self):
+        if self.fsync not in FSYNC_POLICIES:
+            raise ValueError(f'Unknown fsync policy: {self.fsync}')
+
+
+class PartialDownload:
+    """File being downloaded.
+
+    Data is written to [name].part file next to the target path, which is
+    renamed to the target path only when download is complete. If part file
+    is left from previous attempt, download is resumed with Range request.
+
+    Usage:
+        download = PartialDownload(path)
+        stream = client.stream(..., headers=download.request_headers())
+        if download.accept(stream):
+            with download.open() as file: ...
+        download.finish()
+
+    Args:
+        path: target file path [Path]
+        hashed: compute sha256 of file contents while it is written [bool] (Default: False)
+        options: file writing options [WriteOptions] (Default: WriteOptions())
+    """
+
+    def __init__(
+            self, path: Path, hashed: bool = False,
+            options: WriteOptions = WriteOptions()):
+        self.path = path
+        self.options = options
+        self.part_path = path.with_name(path.name + PART_SUFFIX)
+
+        self.offset = 0
+        self.expected_size: int | None = None
+        self._mode = 'wb'
+
+        self._hash = hashlib.sha256() if hashed else None
+        self._hash_done = False
+        self._opened = False
+
+    @property
+    def digest(self) -> str | None:
+        """Hex sha256 of finished file if download is hashed"""
+        return self._hash.hexdigest() if self._hash_done else None
+
+    def is_complete(self) -> bool:
+        """Target file exists only after successful download"""
+        return self.path.exists()
+
+    def request_headers(self) -> dict[str, str]:
+
+        self.offset = (
+            self.part_path.stat().st_size if self.part_path.exists() else 0
+        )
+
+        if not self.offset:
+            return FILE_REQUEST_HEADERS
+
+        return FILE_REQUEST_HEADERS | {'range': f'bytes={self.offset}-'}
+
+    def accept(self, response: httpx.Response) -> bool:
+        """Checks server response. Returns False if there is nothing to write."""
+
+        content_range = CONTENT_RANGE_REGEX.match(
+            response.headers.get('content-range', ''))
+        total_size = (
+            int(content_range[2])
+            if content_range and content_range[2] != '*' else None
+        )
+
+        # Part file may already contain the whole file
+        if response.status_code == 416:
+            if total_size is not None and total_size == self.offset:
+                self.expected_size = total_size
+                return False
+
+            self.part_path.unlink(missing_ok=True)
+            raise IncompleteDownloadError(
+                f'Unable to resume download: {self.path}')
+
+        response.raise_for_status()
+
+        if (response.status_code == 206 and content_range
+                and content_range[1] and int(content_range[1]) == self.offset):
+            self._mode = 'ab'
+            self.expected_size = total_size
+            return True
+
+        # Server ignored range, start from the beginning
+        self.offset = 0
+        self._mode = 'wb'
+
+        content_length = response.headers.get('content-length')
+        self.expected_size = int(content_length) if content_length else None
+
+        return True
+
+    def open(self) -> BinaryIO:
+
+        file = self.part_path.open(
+            self._mode, buffering=self.options.buffer_size)
+        self._opened = True
+
+        if self.options.preallocate and self.expected_size:
+            _preallocate(
+                file.fileno(), self.offset, self.expected_size - self.offset)
+
+        if self._hash:
+            # Resumed data must be hashed too
+            self._hash = hashlib.sha256()
+            if self._mode == 'ab':
+                self._hash_part()
+
+        return _PartFile(file, self._hash, self.options.fsync != 'never')
+
+    def _hash_part(self):
+        with self.part_path.open('rb') as file:
+            while (chunk := file.read(HASH_READ_SIZE)):
+                self._hash.update(chunk)
+
+    def finish(self):
+        """Validates downloaded size and moves part file to target path"""
+
+        size = self.part_path.stat().st_size
+
+        if self.expected_size is not None and size != self.expected_size:
+
+            # Something went completely wrong, do not resume from this
+            if size > self.expected_size:
+                self.part_path.unlink()
+
+            raise IncompleteDownloadError(
+                f'Got {size} of {self.expected_size} bytes: {self.path}')
+
+        if self._hash:
+            # Nothing was written if part file was already complete
+            if not self._opened:
+                self._hash_part()
+            self._hash_done = True
+
+        os.replace(self.part_path, self.path)
+
+        if self.options.fsync == 'full':
+            _fsync_dir(self.path.parent)
+
+
+class _PartFile:
+    """Binary file wrapper updating hash with every written chunk.
+    Optionally flushes file to disk when closed after successful write"""
+
+    def __init__(self, file: BinaryIO, file_hash=None, fsync: bool = False):
+        self._file = file
+        self._hash = file_hash
+        self._fsync = fsync
+
+    def write(self, data: bytes) -> int:
+        if self._hash:
+            self._hash.update(data)
+        return self._file.write(data)
+
+    def close(self, success: bool = True):
+        """Closes file, flushing it to disk after successful write if
+        fsync is enabled"""
+        with self._file:
+            if self._fsync and success:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        self.close(success=exc_type is None)
+
+
+def _load_fallocate():
+    """Linux fallocate, which unlike os.posix_fallocate can reserve space
+    without changing file size"""
+
+    if not sys.platform.startswith('linux'):
+        return None
+
+    try:
+        libc = ctypes.CDLL(None, use_errno=True)
+        fallocate = getattr(libc, 'fallocate64', None) or libc.fallocate
+    except (OSError, AttributeError):
+        return None
+
+    fallocate.argtypes = (
+        ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64)
+    fallocate.restype = ctypes.c_int
+    return fallocate
+
+_fallocate = _load_fallocate()
+
+def _preallocate(fd: int, offset: int, length: int):
+    """Reserves disk space for the rest of file.
+
+    File size is kept, so size of part file left by interrupted download
+    is still the size of received data. Fails silently if file system
+    does not support it."""
+
+    if _fallocate and length > 0:
+        _fallocate(fd, FALLOC_FL_KEEP_SIZE, offset, length)
+
+def _fsync_dir(path: Path):
+
+    # Directories can't be opened on Windows
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+def ensure_parent_dir(path: Path, created: set[Path]):
+    """Creates parent directory of path, once for every directory
+    recorded in created set"""
+
+    if (parent := path.parent) not in created:
+        parent.mkdir(parents=True, exist_ok=True)
+        created.add(parent)
+
+
+__all__ = [
+    'IncompleteDownloadError',
+    'PartialDownload',
+    'WriteOptions',
+    'ensure_parent_dir',
+]
@@ -0,0 +1,104 @@
+import json
+import os
+import time
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Iterable, Iterator, TypeVar
+
+from icecream import ic
+
+from image_scrapper.constants.paths import SYNC_STATE
+
+T = TypeVar('T')
+
+# Number of newest item ids remembered per source. More than one,
+# so sync still stops if the newest item is deleted
+SYNC_KNOWN_ITEMS = 100
+
+
+class SyncState:
+    """Newest items of bulk sources (creators, users, galleries) seen
+    by previous runs.
+
+    Modules pass source items (newest first) through new_items, which
+    stops at the first known item, so listing stops as soon as new items
+    end. Ids of new items are saved by commit, called after the source is
+    downloaded without errors. Each source is stored in its own json file.
+
+    Args:
+        path: state directory [Path] (Default: SYNC_STATE)
+    """
+
+    def __init__(self, path: Path = SYNC_STATE):
+        self.path = path
+        self._pending: dict[str, list[str]] = {}
+        self._lock = Lock()
+
+    def new_items(
+            self, source: str, items: Iterable[T],
+            get_id: Callable[[T], str]) -> Iterator[T]:
+        """Yields items until the first known one.
+
+        Args:
+            source: source key, e.g. "kemono/patreon-123" [str]
+            items: source items, newest first [Iterable]
+            get_id: function returning id of item
+        """
+
+        known = set(self._load(source))
+        new_ids: list[str] = []
+
+        try:
+            for item in items:
+
+                if (item_id := str(get_id(item))) in known:
+                    ic(f'{source}: reached known item {item_id}')
+                    return
+
+                new_ids.append(item_id)
+                yield item
+        finally:
+            with self._lock:
+                self._pending[source] = new_ids
+
+    def commit(self, source: str):
+        """Remembers new items of source returned by last new_items"""
+
+        with self._lock:
+            new_ids = self._pending.pop(source, [])
+
+            ic(f'{source}: {len(new_ids)} new items')
+
+            if not new_ids:
+                return
+
+            state = {
+                'known': (new_ids + self._load(source))[:SYNC_KNOWN_ITEMS],
+                'updated': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }
+
+            state_path = self._state_path(source)
+            state_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Interrupted write must not lose previous state
+            temp_path = state_path.with_name(
+                f'{state_path.name}.{os.getpid()}.tmp')
+            with temp_path.open('w', encoding='UTF-8') as file:
+                json.dump(state, file, indent=2)
+            os.replace(temp_path, state_path)
+
+    def _load(self, source: str) -> list[str]:
+
+        try:
+            with self._state_path(source).open(encoding='UTF-8') as file:
+                return json.load(file)['known']
+        except FileNotFoundError:
+            return []
+
+    def _state_path(self, source: str) -> Path:
+        return self.path / f'{source}.json'
+
+
+__all__ = [
+    'SyncState',
+]
@@ -0,0 +1,228 @@
+
+import hashlib
+import sqlite3
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+from icecream import ic
+
+from image_scrapper.constants.network import (
+    LIST_DEDUP_BLOOM_BITS, LIST_DEDUP_MEMORY_URLS, LIST_READAHEAD)
+
+# Number of bloom filter bit positions per url
+BLOOM_HASHES = 4
+
+
+@dataclass
+class BatchSummary:
+
+    succeeded: int = 0
+    failed: int = 0
+    skipped: int = 0
+    duplicates: int = 0
+    bytes: int = 0
+
+    def __str__(self) -> str:
+        return (f'{self.succeeded} succeeded, {self.failed} failed, '
+                f'{self.skipped} skipped, {self.duplicates} duplicates dropped, '
+                f'{self.bytes} bytes downloaded')
+
+
+class SeenUrls:
+    """Set of url keys with bounded memory usage.
+
+    Keys are stored as 16 byte digests. Newest [memory_urls] digests are
+    kept in memory, older ones are moved to temporary sqlite database
+    which is removed when closed. Bloom filter over moved digests answers
+    most lookups of new urls without reading the database.
+
+    Args:
+        memory_urls: digests kept in memory [int] (Default: LIST_DEDUP_MEMORY_URLS)
+        bloom_bits: size of bloom filter [int] (Default: LIST_DEDUP_BLOOM_BITS)
+    """
+
+    def __init__(
+            self, memory_urls: int = LIST_DEDUP_MEMORY_URLS,
+            bloom_bits: int = LIST_DEDUP_BLOOM_BITS):
+        self.memory_urls = memory_urls
+        self.bloom_bits = bloom_bits
+
+        self._memory: set[bytes] = set()
+        self._bloom: bytearray | None = None
+        self._db: sqlite3.Connection | None = None
+
+    def add(self, key: str) -> bool:
+        """Adds key. Returns False if it was already added."""
+
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+        if digest in self._memory or self._on_disk(digest):
+            return False
+
+        self._memory.add(digest)
+
+        if len(self._memory) >= self.memory_urls:
+            self._spill()
+
+        return True
+
+    def close(self):
+        if self._db:
+            self._db.close()
+            self._db = None
+
+    def _bloom_positions(self, digest: bytes) -> Iterable[int]:
+        for i in range(BLOOM_HASHES):
+            yield int.from_bytes(digest[i * 4:i * 4 + 4], 'little') % self.bloom_bits
+
+    def _on_disk(self, digest: bytes) -> bool:
+
+        if not self._bloom:
+            return False
+
+        for position in self._bloom_positions(digest):
+            if not self._bloom[position >> 3] & (1 << (position & 7)):
+                return False
+
+        row = self._db.execute(
+            'SELECT 1 FROM seen WHERE digest = ?', (digest,)).fetchone()
+        return row is not None
+
+    def _spill(self):
+        """Moves digests from memory to database"""
+
+        if not self._db:
+            # Empty name creates temporary database on disk
+            self._db = sqlite3.connect('')
+            self._db.execute(
+                'CREATE TABLE seen (digest BLOB PRIMARY KEY) WITHOUT ROWID')
+            self._bloom = bytearray(self.bloom_bits // 8 + 1)
+
+        for digest in self._memory:
+            for position in self._bloom_positions(digest):
+                self._bloom[position >> 3] |= 1 << (position & 7)
+
+        self._db.executemany(
+            'INSERT OR IGNORE INTO seen VALUES (?)',
+            ((digest,) for digest in self._memory))
+        self._db.commit()
+
+        ic(f'Moved {len(self._memory)} seen urls to disk')
+        self._memory.clear()
+
+
+def run_batch(
+        urls: Iterable[str],
+        job: Callable[[str], int | None],
+        get_host: Callable[[str], str | None],
+        workers: int,
+        host_workers: int,
+        get_key: Callable[[str], str | None] | None = None,
+        ) -> BatchSummary:
+    """Processes urls in a thread pool.
+
+    Every site gets at most [host_workers] workers, so urls of one slow
+    site do not block urls of others. Status of every url is reported by
+    its line number. Urls with same key as one of previous urls are
+    dropped as duplicates.
+
+    Args:
+        urls: urls to process, one per line [Iterable]
+        job: function downloading single url, returns number of bytes
+            written or None if url was skipped
+        get_host: function returning site name for url
+        workers: maximum number of urls processed at once [int]
+        host_workers: maximum number of urls of one site processed at once [int]
+        get_key: function returning canonical key of url, or None if url
+            is not checked for duplicates (Default: None - no checks)
+    """
+
+    summary = BatchSummary()
+    seen_urls = SeenUrls() if get_key else None
+
+    lines = enumerate(urls, 1)
+    lines_left = True
+
+    waiting: dict[str, deque[tuple[int, str]]] = defaultdict(deque)
+    waiting_count = 0
+    running: dict[str, int] = defaultdict(int)
+    futures: dict[Future, tuple[int, str, str]] = {}
+
+    def read_ahead():
+        nonlocal lines_left, waiting_count
+
+        while lines_left and waiting_count < LIST_READAHEAD:
+
+            if not (line := next(lines, None)):
+                lines_left = False
+                return
+
+            line_n, url = line
+
+            if seen_urls and (key := get_key(url)) \
+                    and not seen_urls.add(key):
+                summary.duplicates += 1
+                ic(f'[Line {line_n}] Duplicate - {url}')
+                continue
+
+            waiting[get_host(url)].append((line_n, url))
+            waiting_count += 1
+
+    def report(future: Future):
+
+        line_n, url, host = futures.pop(future)
+        running[host] -= 1
+
+        try:
+            written = future.result()
+        except Exception as error:
+            summary.failed += 1
+            ic(f'[Line {line_n}] Failed - {url}: {error!r}')
+            return
+
+        if written is None:
+            summary.skipped += 1
+            ic(f'[Line {line_n}] Skipped - {url}')
+            return
+
+        summary.succeeded += 1
+        summary.bytes += written
+        ic(f'[Line {line_n}] Done - {url} ({written} bytes)')
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        while True:
+            read_ahead()
+
+            for host, host_queue in waiting.items():
+                while (host_queue and running[host] < host_workers
+                        and len(futures) < workers):
+
+                    line_n, url = host_queue.popleft()
+                    waiting_count -= 1
+                    running[host] += 1
+
+                    ic(f'[Line {line_n}] - {url}')
+                    future = executor.submit(job, url)
+                    futures[future] = line_n, url, host
+
+            if not futures:
+                break
+
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                report(future)
+
+    if seen_urls:
+        seen_urls.close()
+
+    return summary
+
+
+__all__ = [
+    'BatchSummary',
+    'SeenUrls',
+    'run_batch',
+]
@@ -0,0 +1,112 @@
+
+# ^ Concurrency limits. All limits are per module (i.e. per host),
+# ^ as every module api talks to a single site.
+
+# Number of image viewer pages resolved in parallel by gallery modules
+RESOLVE_WORKERS = 8
+
+# Number of files of one package downloaded in parallel.
+# 1 disables async download engine
+DOWNLOAD_WORKERS = 8
+
+# Number of parallel downloads from a single host (e.g. i.pximg.net)
+DOWNLOAD_HOST_WORKERS = 4
+
+# Number of resolved download units waiting for a free download worker.
+# Package resolution pauses while queue is full
+PIPELINE_QUEUE_SIZE = 32
+
+# ^ Url list (batch) processing
+
+# Number of urls from list processed in parallel
+LIST_WORKERS = 8
+
+# Number of urls of a single site processed in parallel
+LIST_HOST_WORKERS = 2
+
+# Number of list lines read ahead to find urls of idle sites
+LIST_READAHEAD = 1000
+
+# Number of seen urls kept in memory while looking for duplicates in list.
+# Older ones are moved to temporary database on disk
+LIST_DEDUP_MEMORY_URLS = 1_000_000
+
+# Size in bits of bloom filter sparing disk lookups for new urls (16 MiB).
+# Keeps false positive rate under 1% up to ~15 million urls
+LIST_DEDUP_BLOOM_BITS = 2 ** 27
+
+# ^ Page response cache (enabled with --cache)
+
+# Seconds during which cached page is used without asking server.
+# After that page is revalidated with conditional request
+HTTP_CACHE_TTL = 0
+
+# Cache size limit in bytes. Least recently used pages are removed first
+HTTP_CACHE_MAX_SIZE = 512 * 1024 ** 2
+
+# ^ Http connection pool, shared by all modules
+
+# Maximum number of open connections, over all hosts
+POOL_MAX_CONNECTIONS = 100
+
+# Maximum number of idle connections kept open
+POOL_MAX_KEEPALIVE = 40
+
+# Seconds idle connection is kept open
+POOL_KEEPALIVE_EXPIRY = 60.0
+
+# Timeouts in seconds for each phase of request
+TIMEOUT_CONNECT = 10.0
+TIMEOUT_READ = 30.0
+TIMEOUT_WRITE = 30.0
+TIMEOUT_POOL = 60.0
+
+# Multiplex requests to same host over one connection.
+# Requires h2 package (pip install httpx[http2])
+HTTP2 = False
+
+# ^ Retry policy of api requests and file downloads
+
+# Number of attempts before error is raised
+RETRY_ATTEMPTS = 5
+
+# Backoff before n-th retry is BASE * 2 ** (n - 1) seconds, capped by MAX.
+# Half of the backoff is random to spread retries of parallel workers
+RETRY_BACKOFF_BASE = 1.0
+RETRY_BACKOFF_MAX = 60.0
+
+# Longest Retry-After (429, 503) server is allowed to make us wait
+RETRY_AFTER_MAX = 600.0
+
+# Consecutive transient failures after which all requests
+# to the host are paused for cooldown seconds
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_COOLDOWN = 60.0
+
+__all__ = [
+    'RESOLVE_WORKERS',
+    'DOWNLOAD_WORKERS',
+    'DOWNLOAD_HOST_WORKERS',
+    'PIPELINE_QUEUE_SIZE',
+    'LIST_WORKERS',
+    'LIST_HOST_WORKERS',
+    'LIST_READAHEAD',
+    'LIST_DEDUP_MEMORY_URLS',
+    'LIST_DEDUP_BLOOM_BITS',
+    'HTTP_CACHE_TTL',
+    'HTTP_CACHE_MAX_SIZE',
+    'POOL_MAX_CONNECTIONS',
+    'POOL_MAX_KEEPALIVE',
+    'POOL_KEEPALIVE_EXPIRY',
+    'TIMEOUT_CONNECT',
+    'TIMEOUT_READ',
+    'TIMEOUT_WRITE',
+    'TIMEOUT_POOL',
+    'HTTP2',
+    'RETRY_ATTEMPTS',
+    'RETRY_BACKOFF_BASE',
+    'RETRY_BACKOFF_MAX',
+    'RETRY_AFTER_MAX',
+    'CIRCUIT_FAILURE_THRESHOLD',
+    'CIRCUIT_COOLDOWN',
+]
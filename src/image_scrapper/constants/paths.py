@@ -5,8 +5,25 @@ APP_DATA = Path('Data')
 
 DOWNLOADS = APP_DATA / 'Downloads'
 COOKIES = APP_DATA / '.cookies'
+CACHE = APP_DATA / '.cache'
+
+HTTP_CACHE = CACHE / 'http'
+
+# Index of downloaded files contents used for deduplication
+DEDUP_INDEX = APP_DATA / '.store' / 'hashes.sqlite'
+
+# Index of downloaded files: where they came from and their status
+DOWNLOAD_INDEX = APP_DATA / '.store' / 'downloads.sqlite'
+
+# Newest known items of synced sources (creators, users)
+SYNC_STATE = APP_DATA / '.sync'
 
 __all__ = [
     'DOWNLOADS',
-    'COOKIES'
+    'COOKIES',
+    'CACHE',
+    'HTTP_CACHE',
+    'DEDUP_INDEX',
+    'DOWNLOAD_INDEX',
+    'SYNC_STATE',
 ]
\ No newline at end of file
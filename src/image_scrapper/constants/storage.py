@@ -0,0 +1,35 @@
+
+# ^ Writing of downloaded files
+
+# Size of chunks file is received and written in
+FILE_CHUNK_SIZE = 256 * 1024
+
+# Size of write buffer. Chunks are collected in it and written to disk
+# with a single call, which matters on network storage
+FILE_WRITE_BUFFER = 1024 ** 2
+
+# Reserve disk space for the whole file (from Content-Length)
+# before writing it. Reduces fragmentation on local disks
+FILE_PREALLOCATE = True
+
+# When downloaded data is flushed to disk:
+#   "never" - leave it to operating system;
+#   "file" - before part file is renamed, so finished file is never truncated;
+#   "full" - also flush directory after rename, so rename survives a crash
+FSYNC_POLICY = 'never'
+
+# ^ Download index
+
+# Index updates are committed together, after this many updates or
+# seconds since last commit (and on exit)
+INDEX_COMMIT_EVERY = 200
+INDEX_COMMIT_INTERVAL = 2.
+
+__all__ = [
+    'FILE_CHUNK_SIZE',
+    'FILE_WRITE_BUFFER',
+    'FILE_PREALLOCATE',
+    'FSYNC_POLICY',
+    'INDEX_COMMIT_EVERY',
+    'INDEX_COMMIT_INTERVAL',
+]
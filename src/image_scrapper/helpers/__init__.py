@@ -1 +1,4 @@
-from .helpers import *
\ No newline at end of file
+from .helpers import *
+from .concurrency import *
+from .metrics import *
+from .retry import *
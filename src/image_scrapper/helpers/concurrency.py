@@ -0,0 +1,50 @@
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def ordered_map(
+        func: Callable[[T], R],
+        items: Iterable[T],
+        workers: int,
+        window: int | None = None,
+        ) -> Iterator[R]:
+    """Lazily maps function over items in a thread pool.
+
+    Results are yielded in the same order as items. At most [window]
+    calls are running or waiting to be consumed at any moment, so
+    memory usage does not depend on the number of items.
+
+    Args:
+        func: function to call for each item
+        items: items to process [Iterable]
+        workers: maximum number of parallel calls [int]
+        window: maximum number of pending results [int] (Default: workers * 2)
+    """
+
+    window = window or workers * 2
+    pending: deque[Future] = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for item in items:
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(func, item))
+
+            while pending:
+                yield pending.popleft().result()
+
+        finally:
+            # Do not wait for results nobody is going to consume
+            for future in pending:
+                future.cancel()
+
+
+__all__ = [
+    'ordered_map',
+]
@@ -2,9 +2,11 @@
 import re
 from pathlib import Path
 from itertools import zip_longest
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
-from httpx import Response
-from tenacity import retry, stop_after_attempt
+if TYPE_CHECKING:
+    from httpx import Response
 
 SYMBOL_REPLACEMENTS = {
     '::': '', ':': '-',
@@ -16,19 +18,41 @@ SYMBOL_REPLACEMENTS = {
 
 EXTENSION_PATTERN = re.compile('\.(png|jpe?g?|webp|mp4|(?:t|g)if|psd)')
 
+# Query parameters added by link sharing, not by site
+TRACKING_PARAMS = {'ref', 'fbclid', 'gclid', 'igshid', 'si', 'mc_cid', 'mc_eid'}
+TRACKING_PARAM_PREFIXES = ('utm_',)
+
 
 def extract_file_extension(url: str, pattern: re.Pattern = EXTENSION_PATTERN) -> str:
     return list(pattern.finditer(url))[-1][1]
 
-# TODO: logging retries
-def retry_times(attempts: int):
-    return retry(stop = stop_after_attempt(attempts))
-
 def replace_win_path_symbols(string: str) -> str:
     for symbol, replacement in SYMBOL_REPLACEMENTS.items():
         string = string.replace(symbol, replacement)
     return string
 
+def canonicalize_url(url: str, keep_query: bool = True) -> str:
+    """Common url normalization: lowercase scheme and host, no fragment,
+    tracking query parameters and trailing slash. Remaining query
+    parameters are sorted.
+
+    Args:
+        url: url to normalize [str]
+        keep_query: keep non-tracking query parameters [bool] (Default: True)
+    """
+
+    scheme, netloc, path, query, _ = urlsplit(url.strip())
+
+    params = sorted(
+        (name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+            if name not in TRACKING_PARAMS
+                and not name.startswith(TRACKING_PARAM_PREFIXES)
+    ) if keep_query else []
+
+    return urlunsplit((
+        scheme.lower(), netloc.lower(), path.rstrip('/'), urlencode(params), '',
+    ))
+
 def read_cookies(cookie_path: Path) -> dict[str, str]:
     
     if not cookie_path.exists():
@@ -45,7 +69,7 @@ def write_cookies(cookies: dict[str, str], cookie_file: Path):
             cookie_pair = f'{key}\n{value}\n'
             f.write(cookie_pair)
 
-def dump_response_text(response: Response, file_name: str, extension: str = 'html'):
+def dump_response_text(response: 'Response', file_name: str, extension: str = 'html'):
     """Shortcut function to save http response text to an file. Used to debug web scraping scripts
     
     :Args:
@@ -58,9 +82,9 @@ def dump_response_text(response: Response, file_name: str, extension: str = 'htm
 
 
 __all__ = [
-    'retry_times',
     'replace_win_path_symbols',
     'extract_file_extension',
+    'canonicalize_url',
     'read_cookies',
     'write_cookies',
     'dump_response_text',
@@ -0,0 +1,217 @@
+
+import cProfile
+import json
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from threading import Lock
+from typing import Iterator
+from urllib.parse import urlsplit
+
+PROMETHEUS_PREFIX = 'image_scrapper'
+
+# Number of top allocation sites written by memory profile
+TRACEMALLOC_TOP = 50
+
+
+@dataclass
+class Measurement:
+    """Values of a single measured operation filled by caller"""
+
+    bytes: int = 0
+    status: int | None = None
+
+
+@dataclass
+class StageStats:
+
+    count: int = 0
+    errors: int = 0
+    retries: int = 0
+    seconds: float = 0.
+    max_seconds: float = 0.
+    bytes: int = 0
+    statuses: Counter = field(default_factory=Counter)
+
+
+StatsKey = tuple[str, str, str]
+
+
+class Metrics:
+    """Collects durations, bytes, status codes and retries of every
+    stage (get, post, parse, file, text), per module and host.
+
+    Disabled by default. When disabled measuring costs nothing but
+    a single attribute check.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._stats: dict[StatsKey, StageStats] = {}
+        self._lock = Lock()
+
+    @contextmanager
+    def measure(
+            self, stage: str, module: str = '', host: str = '',
+            ) -> Iterator[Measurement]:
+        """Measures duration of code block.
+        Yields Measurement to set transferred bytes and status code."""
+
+        measurement = Measurement()
+
+        if not self.enabled:
+            yield measurement
+            return
+
+        start = time.perf_counter()
+        failed = False
+
+        try:
+            yield measurement
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+
+            with self._lock:
+                stats = self._get_stats(stage, module, host)
+                stats.count += 1
+                stats.errors += failed
+                stats.seconds += elapsed
+                stats.max_seconds = max(stats.max_seconds, elapsed)
+                stats.bytes += measurement.bytes
+                if measurement.status is not None:
+                    stats.statuses[measurement.status] += 1
+
+    def record_retry(self, stage: str, module: str = '', host: str = ''):
+
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._get_stats(stage, module, host).retries += 1
+
+    def _get_stats(self, stage: str, module: str, host: str) -> StageStats:
+        key = stage, module, host
+        if key not in self._stats:
+            self._stats[key] = StageStats()
+        return self._stats[key]
+
+    # ^ ---- Export
+
+    def as_list(self) -> list[dict]:
+
+        with self._lock:
+            return [
+                {
+                    'stage': stage, 'module': module, 'host': host,
+                    'count': stats.count,
+                    'errors': stats.errors,
+                    'retries': stats.retries,
+                    'seconds': round(stats.seconds, 6),
+                    'max_seconds': round(stats.max_seconds, 6),
+                    'bytes': stats.bytes,
+                    'statuses': {
+                        str(status): n for status, n in stats.statuses.items()
+                    },
+                }
+                    for (stage, module, host), stats in sorted(self._stats.items())
+            ]
+
+    def to_json(self) -> str:
+        return json.dumps(self.as_list(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Metrics in Prometheus text exposition format (for node exporter
+        textfile collector)"""
+
+        counters = {
+            'count': 'Number of operations',
+            'errors': 'Number of failed operations',
+            'retries': 'Number of retried attempts',
+            'seconds': 'Total duration of operations in seconds',
+            'bytes': 'Number of transferred bytes',
+        }
+
+        entries = self.as_list()
+        lines = []
+
+        for name, description in counters.items():
+            metric = f'{PROMETHEUS_PREFIX}_{name}_total'
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} counter')
+            for entry in entries:
+                lines.append(f'{metric}{{{_labels(entry)}}} {entry[name]}')
+
+        metric = f'{PROMETHEUS_PREFIX}_responses_total'
+        lines.append(f'# HELP {metric} Number of responses by status code')
+        lines.append(f'# TYPE {metric} counter')
+        for entry in entries:
+            for status, n in entry['statuses'].items():
+                labels = _labels(entry) + f',status="{status}"'
+                lines.append(f'{metric}{{{labels}}} {n}')
+
+        return '\n'.join(lines) + '\n'
+
+    def export(self, path: Path):
+        """Writes metrics to file. Files with .prom extension are written
+        in Prometheus format, any other in json"""
+
+        text = self.to_prometheus() if path.suffix == '.prom' else self.to_json()
+
+        with path.open('w', encoding='UTF-8') as file:
+            file.write(text)
+
+
+def _labels(entry: dict) -> str:
+    return ','.join(
+        f'{label}="{entry[label]}"' for label in ('stage', 'module', 'host')
+    )
+
+
+def url_host(url: str) -> str:
+    return urlsplit(url).hostname or ''
+
+
+@contextmanager
+def profile(output_prefix: Path):
+    """Profiles code block with cProfile and tracemalloc.
+
+    Writes [prefix].prof (open with pstats or snakeviz) and [prefix].mem.txt
+    with top allocation sites. cProfile only sees the calling thread.
+    """
+
+    profiler = cProfile.Profile()
+    tracemalloc.start()
+    profiler.enable()
+
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(f'{output_prefix}.prof')
+
+        with open(f'{output_prefix}.mem.txt', 'w', encoding='UTF-8') as file:
+            file.write(f'Peak traced memory: {peak} bytes\n\n')
+            for stat in snapshot.statistics('lineno')[:TRACEMALLOC_TOP]:
+                file.write(f'{stat}\n')
+
+
+metrics = Metrics()
+
+
+__all__ = [
+    'Measurement',
+    'Metrics',
+    'metrics',
+    'profile',
+    'url_host',
+]
@@ -0,0 +1,232 @@
+import asyncio
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from functools import wraps
+from inspect import iscoroutinefunction
+from threading import Lock
+from typing import Callable
+
+import httpx
+from icecream import ic
+from tenacity import (
+    RetryCallState, retry, retry_if_exception, stop_after_attempt)
+
+from image_scrapper.constants.network import (
+    CIRCUIT_COOLDOWN, CIRCUIT_FAILURE_THRESHOLD, RETRY_AFTER_MAX,
+    RETRY_ATTEMPTS, RETRY_BACKOFF_BASE, RETRY_BACKOFF_MAX)
+
+from .metrics import metrics, url_host
+
+# Statuses which may turn into success if request is repeated later.
+# Any other 4xx status is permanent and is raised immediately
+TRANSIENT_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+# Statuses with which server may tell how long to wait
+RETRY_AFTER_STATUSES = {429, 503}
+
+
+class TransientError(Exception):
+    """Error which may not happen again if operation is repeated
+    (e.g. connection closed before whole file was received)"""
+    ...
+
+
+class CircuitBreaker:
+    """Pauses all requests to a host after several consecutive failures,
+    so queued urls wait for the host instead of spending their retries.
+
+    Pause ends after cooldown. A failure right after that pauses host again,
+    a success resets it.
+    """
+
+    def __init__(
+            self,
+            threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+            cooldown: float = CIRCUIT_COOLDOWN,
+            ):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures: dict[str, int] = {}
+        self._paused_until: dict[str, float] = {}
+        self._lock = Lock()
+
+    def remaining(self, host: str) -> float:
+        """Seconds left until host is available"""
+        return max(self._paused_until.get(host, 0.) - time.monotonic(), 0.)
+
+    def pause(self, host: str, seconds: float):
+
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until <= self._paused_until.get(host, 0.):
+                return
+            self._paused_until[host] = until
+
+        ic(f'Pausing requests to {host} for {seconds:.0f}s')
+
+    def record_success(self, host: str):
+        self._failures.pop(host, None)
+
+    def record_failure(self, host: str):
+
+        with self._lock:
+            failures = self._failures.get(host, 0) + 1
+            self._failures[host] = failures
+
+        if failures >= self.threshold:
+            self.pause(host, self.cooldown)
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def _error_status(error: BaseException) -> int | None:
+    """Status code of http error (httpx.HTTPStatusError)"""
+    response = getattr(error, 'response', None)
+    return getattr(response, 'status_code', None)
+
+def _is_host_failure(error: BaseException) -> bool:
+    """Network errors and transient statuses, which count against host"""
+
+    if isinstance(error, httpx.TransportError):
+        return not isinstance(error, httpx.UnsupportedProtocol)
+
+    status = _error_status(error)
+
+    return status is not None and (
+        status in TRANSIENT_STATUSES or status >= 500)
+
+def is_transient(error: BaseException) -> bool:
+    """Network errors, 5xx, 429 and TransientError are retried.
+    Anything else (e.g. local OSError, parsing errors) is permanent."""
+    return isinstance(error, TransientError) or _is_host_failure(error)
+
+def retry_after(error: BaseException) -> float | None:
+    """Delay from Retry-After header of 429 and 503 responses"""
+
+    if _error_status(error) not in RETRY_AFTER_STATUSES:
+        return None
+
+    value = error.response.headers.get('retry-after', '').strip()
+
+    if value.isdigit():
+        delay = float(value)
+    else:
+        try:
+            date = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        delay = (date - datetime.now(timezone.utc)).total_seconds()
+
+    return min(max(delay, 0.), RETRY_AFTER_MAX)
+
+def _call_url(args: tuple) -> str:
+    """First string argument of api method is request url"""
+    return next((arg for arg in args[1:] if isinstance(arg, str)), '')
+
+def _record_failure(host: str, error: BaseException):
+
+    if not host or not _is_host_failure(error):
+        return
+
+    delay = retry_after(error)
+    if delay:
+        circuit_breaker.pause(host, delay)
+
+    circuit_breaker.record_failure(host)
+
+def _backoff(retry_state: RetryCallState) -> float:
+    """Waits as long as server or circuit breaker asks, otherwise
+    exponential backoff with jitter"""
+
+    error = retry_state.outcome.exception()
+    host = url_host(_call_url(retry_state.args))
+
+    delay = retry_after(error)
+
+    if delay is None:
+        backoff = min(
+            RETRY_BACKOFF_BASE * 2 ** (retry_state.attempt_number - 1),
+            RETRY_BACKOFF_MAX,
+        )
+        delay = backoff / 2 + random.uniform(0, backoff / 2)
+
+    return max(delay, circuit_breaker.remaining(host))
+
+def _log_retry(retry_state: RetryCallState):
+    """Reports failed attempt of retried api method"""
+
+    stage = retry_state.fn.__name__.strip('_')
+    owner = retry_state.args[0] if retry_state.args else None
+
+    # Async engine methods belong to engine, which downloads for an api
+    api = getattr(owner, 'api', owner)
+    module = getattr(api, 'module_name', '')
+
+    url = _call_url(retry_state.args)
+    error = retry_state.outcome.exception()
+
+    ic(f'Retrying {stage} {url} in {retry_state.next_action.sleep:.1f}s '
+       f'(attempt {retry_state.attempt_number}): {error!r}')
+    metrics.record_retry(stage, module, url_host(url))
+
+def retry_times(attempts: int = RETRY_ATTEMPTS):
+    """Retries api method (sync or async) on transient errors.
+
+    Honors Retry-After and pauses of host circuit breaker. Url of request
+    must be first string argument of method.
+    """
+
+    retrying = retry(
+        stop = stop_after_attempt(attempts),
+        wait = _backoff,
+        retry = retry_if_exception(is_transient),
+        before_sleep = _log_retry,
+        reraise = True,
+    )
+
+    def decorator(func: Callable) -> Callable:
+
+        if iscoroutinefunction(func):
+
+            @wraps(func)
+            async def attempt(*args, **kwargs):
+                host = url_host(_call_url(args))
+                await asyncio.sleep(circuit_breaker.remaining(host))
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as error:
+                    _record_failure(host, error)
+                    raise
+                circuit_breaker.record_success(host)
+                return result
+
+        else:
+
+            @wraps(func)
+            def attempt(*args, **kwargs):
+                host = url_host(_call_url(args))
+                time.sleep(circuit_breaker.remaining(host))
+                try:
+                    result = func(*args, **kwargs)
+                except Exception as error:
+                    _record_failure(host, error)
+                    raise
+                circuit_breaker.record_success(host)
+                return result
+
+        return retrying(attempt)
+
+    return decorator
+
+
+__all__ = [
+    'CircuitBreaker',
+    'TransientError',
+    'circuit_breaker',
+    'is_transient',
+    'retry_after',
+    'retry_times',
+]
@@ -6,4 +6,4 @@ module_apis = single_apis | gallery_apis
 
 __all__ = [
     'module_apis'
-]
\ No newline at end of file
+]
@@ -1,14 +1,18 @@
 
 import importlib
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from image_scrapper.api import (
-    GalleryParseParams, GalleryApi, get_gallery_api)
+from ..registry import ModuleRegistry
+
+if TYPE_CHECKING:
+    from image_scrapper.api import GalleryApi, GalleryParseParams, RateLimits
 
 
 SELF_PATH = Path(__file__).absolute().parent
 
-def get_parse_params(module_name: str) -> GalleryParseParams:
+def get_parse_params(module_name: str) -> 'GalleryParseParams':
     
     module = importlib.import_module(
         f'.{module_name}', __name__
@@ -22,11 +26,33 @@ def get_parse_params(module_name: str) -> GalleryParseParams:
 
     return parse_params
 
+def get_rate_limits(module_name: str) -> 'RateLimits | None':
+
+    module = importlib.import_module(
+        f'.{module_name}', __name__
+    )
+
+    return getattr(module, 'LOCAL_RATE_LIMITS', None)
+
+def load_api(module_name: str) -> 'GalleryApi':
+    """Imports module and creates its api"""
+
+    # Imported here to keep module listing free of http/parsing libraries
+    from image_scrapper.api import get_gallery_api
+
+    return get_gallery_api(
+        get_parse_params(module_name), get_rate_limits(module_name))
+
+
 module_names = (
     module_path.stem for module_path in SELF_PATH.glob('*')
         if module_path.suffix == '.py' and module_path.stem != '__init__'
 )
 
-module_apis = {
-    name: get_gallery_api(get_parse_params(name)) for name in module_names
-}
+module_apis = ModuleRegistry({
+    name: partial(load_api, name) for name in module_names
+})
+
+__all__ = [
+    'module_apis'
+]
@@ -0,0 +1,78 @@
+
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Mapping
+
+if TYPE_CHECKING:
+    from image_scrapper.api import ScrapperApi
+
+
+class ModuleRegistry(Mapping[str, 'ScrapperApi']):
+    """Maps module names (url hosts) to module apis.
+
+    Modules are not imported until their api is requested. Api (with its
+    http client and cookies) is created on first request and reused after.
+    Listing module names does not import anything.
+
+    Args:
+        loaders: module name -> function creating module api [dict]
+        options: api attributes set on every created api [dict]
+    """
+
+    def __init__(
+            self, loaders: dict[str, Callable[[], 'ScrapperApi']],
+            options: dict[str, Any] | None = None):
+        self._loaders = loaders
+        self._options = options or {}
+        self._apis: dict[str, 'ScrapperApi'] = {}
+        self._lock = Lock()
+
+    def __getitem__(self, name: str) -> 'ScrapperApi':
+
+        if (api := self._apis.get(name)):
+            return api
+
+        loader = self._loaders[name]
+
+        # Same module may be requested from several threads at once
+        with self._lock:
+            if name not in self._apis:
+                api = loader()
+                api.module_name = name
+                self._apply_options(api, self._options)
+                self._apis[name] = api
+
+        return self._apis[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._loaders)
+
+    def __len__(self) -> int:
+        return len(self._loaders)
+
+    def __or__(self, other: 'ModuleRegistry') -> 'ModuleRegistry':
+        return ModuleRegistry(
+            self._loaders | other._loaders, self._options | other._options)
+
+    def configure(self, **options: Any):
+        """Sets api attributes (e.g. cache) for all modules,
+        including ones which are not loaded yet"""
+
+        with self._lock:
+            self._options |= options
+
+            for api in self._apis.values():
+                self._apply_options(api, options)
+
+    @staticmethod
+    def _apply_options(api: 'ScrapperApi', options: dict[str, Any]):
+        for name, value in options.items():
+            setattr(api, name, value)
+
+    def loaded(self) -> list[str]:
+        """Names of modules which apis were already created"""
+        return list(self._apis)
+
+
+__all__ = [
+    'ModuleRegistry',
+]
@@ -1,13 +1,17 @@
 
 import importlib
 from dataclasses import dataclass
+from functools import partial
 from pathlib import Path
-from typing import Callable
+from typing import TYPE_CHECKING, Callable
 
-from image_scrapper.api import get_api, ScrapperApi
 from image_scrapper.helpers import read_cookies
 
-import httpx
+from ..registry import ModuleRegistry
+
+if TYPE_CHECKING:
+    import httpx
+    from image_scrapper.api import RateLimits, ScrapperApi
 
 
 SELF_PATH = Path(__file__).absolute().parent
@@ -26,7 +30,7 @@ def is_module(path: Path) -> bool:
         return True
     
     # Python package module
-    if path.is_dir() and path.glob('__init__.py'):
+    if path.is_dir() and (path / '__init__.py').exists():
         return True
     
     return False
@@ -35,12 +39,13 @@ def is_module(path: Path) -> bool:
 @dataclass
 class ModuleData:
 
-    api_class: Callable[[httpx.Client], ScrapperApi]
+    api_class: Callable[['httpx.Client'], 'ScrapperApi']
     headers: dict
     cookies: dict
+    rate_limits: 'RateLimits | None' = None
 
     def unpack(self):
-        return self.api_class, self.headers, self.cookies
+        return self.api_class, self.headers, self.cookies, self.rate_limits
     
 
 def get_module_data(module_name: str) -> ModuleData:
@@ -66,7 +71,19 @@ def get_module_data(module_name: str) -> ModuleData:
     except AttributeError:
         cookies = {}
 
-    return ModuleData(api_class, headers, cookies)
+    # Modules without limits send requests as fast as workers allow
+    rate_limits = getattr(module, 'LOCAL_RATE_LIMITS', None)
+
+    return ModuleData(api_class, headers, cookies, rate_limits)
+
+
+def load_api(module_name: str) -> 'ScrapperApi':
+    """Imports module and creates its api"""
+
+    # Imported here to keep module listing free of http/parsing libraries
+    from image_scrapper.api import get_api
+
+    return get_api(*get_module_data(module_name).unpack())
 
 
 module_names = (
@@ -74,10 +91,9 @@ module_names = (
         if is_module(module_path)
 )
 
-module_apis = {
-    name: get_api(*get_module_data(name).unpack())
-        for name in module_names
-}
+module_apis = ModuleRegistry({
+    name: partial(load_api, name) for name in module_names
+})
 
 __all__ = [
     'module_apis'
@@ -1,32 +1,53 @@
 import re
 from dataclasses import dataclass, field
+from operator import itemgetter
+from threading import Lock
 from typing import Iterable
+from urllib.parse import urlencode
 
-from bs4 import BeautifulSoup as bs
-from httpx import Response
+from httpx import URL, Response
 from icecream import ic
 
 from image_scrapper.api import (
-    AuthorPackage, DownloadUnit, ScrapperApi,
-    UnloggedError, construct_package_name
+    AuthorPackage, CollectionPackage, DownloadUnit, Node, RateLimits,
+    ScrapperApi, UnloggedError, construct_package_name, parse_html
 )
+from image_scrapper.constants.network import RESOLVE_WORKERS
 from image_scrapper.constants.paths import COOKIES, DOWNLOADS
 from image_scrapper.helpers import (
     extract_file_extension,
+    ordered_map,
     replace_win_path_symbols,
-    write_cookies, dump_response_text
+    write_cookies
+)
+from .stash import (
+    STASH_CACHE, StashResolver, find_stash_urls, get_stash_urls
 )
-from .stash import get_stash_urls
 
 LOCAL_HEADERS = {'referer': 'https://www.deviantart.com'}
 
 LOCAL_DOWNLOADS = DOWNLOADS / 'deviantart'
 LOCAL_COOKIES = COOKIES / 'deviantart'
 
+LOCAL_RATE_LIMITS = RateLimits(page_rate=1., file_rate=4., file_burst=4)
+
 STASH_REGEX = re.compile('(sta\.sh\/[0-9a-z]+)\??')
 
 SIZE_REGEX = re.compile('size([0-9]+x[0-9]+)px')
 
+# [user]/art/[title]-[id]
+DEVIATION_PATH_REGEX = re.compile(r'^/[\w-]+/art/(?:[\w-]+-)?(\d+)/?$')
+
+# [user]/gallery, [user]/gallery/all, [user]/gallery/scraps
+# or [user]/gallery/[folder id]/[name]
+GALLERY_PATH_REGEX = re.compile(
+    r'^/([\w-]+)/gallery(?:/(all|scraps|\d+)(?:/[\w-]+)?)?/?$')
+
+GALLERY_API_URL = 'https://www.deviantart.com/_napi/da-user-profile/api/gallery/contents'
+
+# Number of deviations in one page of gallery contents
+GALLERY_PAGE_SIZE = 24
+
 
 @dataclass
 class DeviantartPackage(AuthorPackage):
@@ -57,11 +78,8 @@ class DeviantartPackage(AuthorPackage):
             text_path = base_path.with_suffix('.txt')
             yield DownloadUnit(self.description, text_path, kind='text')
 
-            ic(self.stash_urls)
-
             if not self.stash_urls:
-                ic('STOP!!!!!')
-                raise StopIteration
+                return
 
             for img_url, img_title in self.stash_urls:
 
@@ -76,6 +94,17 @@ class DeviantartPackage(AuthorPackage):
 
                 yield DownloadUnit(img_url, stash_path)
 
+@dataclass
+class DeviationPage:
+    """Data extracted from deviation page"""
+
+    title: str
+    author: str
+    download_url: str | None
+    description: str | None
+    stash_urls: list[str]
+
+
 def _get_original_link(fullview: str, image_size: tuple[int, int]) -> str:
     
     if '.png?' in fullview:
@@ -93,7 +122,7 @@ def _get_original_link(fullview: str, image_size: tuple[int, int]) -> str:
 
     return f'{beginning}{divider}{dimensions}/{stem}'
 
-def _get_download_url(main: bs) -> str | None:
+def _get_download_url(main: Node) -> str | None:
     
     download_button = main.select_one('a[data-hook=download_button]')
 
@@ -122,7 +151,7 @@ def _get_download_url(main: bs) -> str | None:
 
     return None
 
-def _get_description(main: bs) -> str | None:
+def _get_description(main: Node) -> str | None:
     
     # If description isn't present by either of selectors return None
     if (editor_journal := \
@@ -133,50 +162,174 @@ def _get_description(main: bs) -> str | None:
     return None
 
 
+@dataclass
 class LocalApi(ScrapperApi):
 
-    def parse(self, response: Response) -> DeviantartPackage:
+    # Created on first use: saved to disk if page cache is enabled
+    _stash_resolver: StashResolver | None = field(
+        default=None, init=False, repr=False)
+    _stash_lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    # Gallery deviations are parsed in parallel, but new cookies are
+    # asked for only once
+    _cookies_asked: bool = field(default=False, init=False, repr=False)
+    _login_lock: Lock = field(default_factory=Lock, init=False, repr=False)
+
+    @property
+    def stash_resolver(self) -> StashResolver:
+
+        with self._stash_lock:
+            if not self._stash_resolver:
+                self._stash_resolver = StashResolver(
+                    STASH_CACHE if self.cache else None)
+
+        return self._stash_resolver
+
+    def canonical_url(self, url: str) -> str:
+
+        path = URL(url).path
+
+        # Same deviation is linked with different titles and user name case
+        if (match := DEVIATION_PATH_REGEX.match(path)):
+            return f'https://www.deviantart.com/deviation/{match[1]}'
+
+        if (match := GALLERY_PATH_REGEX.match(path)):
+            username, folder = match.groups()
+            return (f'https://www.deviantart.com/{username.lower()}'
+                    f'/gallery/{folder or "all"}')
+
+        return super().canonical_url(url)
+
+    def request_url(self, url: str) -> str:
+
+        if not (match := GALLERY_PATH_REGEX.match(URL(url).path)):
+            return url
+
+        username, folder = match.groups()
+        return _gallery_api_url(username, folder, 0)
+
+    def parse(self, response: Response) -> DeviantartPackage | CollectionPackage:
+
+        if response.url.path.startswith('/_napi/'):
+            return self.parse_gallery(response)
+
+        return self.parse_deviation(response)
+
+    def parse_gallery(self, response: Response) -> CollectionPackage:
+        """All deviations of gallery folder (or whole gallery), newest
+        first. Deviation pages are resolved in parallel while previous
+        deviations are downloaded."""
+
+        params = response.url.params
+        username = params['username']
+        folder = params.get('folderid') or (
+            'scraps' if params.get('scraps_folder') else 'all')
+
+        def make_packages(
+                deviations: Iterable[dict]) -> Iterable[DeviantartPackage]:
+            return ordered_map(
+                self._deviation_package, deviations, workers=RESOLVE_WORKERS)
+
+        return self.collect(
+            f'{username}-{folder}',
+            self._gallery_deviations(username, folder, response.json()),
+            itemgetter('deviationId'), make_packages,
+        )
+
+    def _gallery_deviations(
+            self, username: str, folder: str, page: dict) -> Iterable[dict]:
+        """Deviations of gallery contents pages, starting from given one"""
+
+        while True:
+            for result in page['results']:
+                yield result['deviation']
+
+            if not page.get('hasMore'):
+                return
+
+            page = self.get(_gallery_api_url(
+                username, folder, page['nextOffset'])).json()
+
+    def _deviation_package(self, deviation: dict) -> DeviantartPackage:
+        return self.parse_deviation(self.get(deviation['url']))
+
+    def parse_deviation(self, response: Response) -> DeviantartPackage:
 
         cookies = response.cookies
 
-        dump_response_text(response, 'deviantart')
+        page = self.extract(_extract_deviation, response)
 
-        main = bs(response.text, 'lxml')
+        if not page:
+            self._ask_cookies()
+            raise UnloggedError
+        
+        da_id = str(response.url).rsplit('-', maxsplit=1)[-1]
+        stash_urls = get_stash_urls(
+            self, self.stash_resolver, page.stash_urls)
+
+        return DeviantartPackage(
+            da_id, page.title, page.author, page.download_url,
+            page.description, stash_urls,
+        )
 
-        if 'Log In' in main.text:
+    def _ask_cookies(self):
+
+        with self._login_lock:
+            if self._cookies_asked:
+                return
+            self._cookies_asked = True
 
             print('Cookies outdated! '
                     'Please enter new cookies and restart program:')
-            
+
             cookies = {
                 'auth': input('auth: '),
                 'auth_secure': input('auth_secure: '),
                 'userinfo': input('userinfo: ')
             }
-            
+
             write_cookies(cookies, LOCAL_COOKIES)
 
-            raise UnloggedError
-        
-        da_id = str(response.url).rsplit('-', maxsplit=1)[-1]
-        title, author = main.select_one('title') \
-            .text.strip() \
-            .removesuffix(' on DeviantArt') \
-            .rsplit(' by ', maxsplit=1)
 
-        download_url = _get_download_url(main)
-        description = _get_description(main)
-        stash_urls = get_stash_urls(self, main)
+def _extract_deviation(markup: str) -> DeviationPage | None:
+    """Data of deviation page. None if page asks to log in"""
 
-        
-        return DeviantartPackage(
-            da_id, title, author, download_url, description, stash_urls
-        )
+    main = parse_html(markup)
+
+    if 'Log In' in main.text:
+        return None
+
+    title, author = main.select_one('title') \
+        .text.strip() \
+        .removesuffix(' on DeviantArt') \
+        .rsplit(' by ', maxsplit=1)
+
+    return DeviationPage(
+        title, author,
+        _get_download_url(main), _get_description(main),
+        find_stash_urls(main),
+    )
+
+
+def _gallery_api_url(username: str, folder: str | None, offset: int) -> str:
+
+    params = {'username': username, 'offset': offset, 'limit': GALLERY_PAGE_SIZE}
+
+    # Whole gallery does not include scraps
+    if folder == 'scraps':
+        params['scraps_folder'] = 'true'
+    elif folder and folder != 'all':
+        params['folderid'] = folder
+    else:
+        params['all_folder'] = 'true'
+
+    return f'{GALLERY_API_URL}?{urlencode(params)}'
 
 
 __all__ = [
     'LocalApi',
     'LOCAL_COOKIES',
     'LOCAL_HEADERS',
+    'LOCAL_RATE_LIMITS',
 ]
 
@@ -1,25 +1,207 @@
 
+import atexit
+import json
+import os
 import re
-from typing import Iterable
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from threading import Lock
+from typing import Callable, Iterable
 
-from bs4 import BeautifulSoup as bs
 from icecream import ic
 
-from image_scrapper.api import ScrapperApi
+from image_scrapper.api import Node, ScrapperApi, parse_html
+from image_scrapper.constants.network import RESOLVE_WORKERS
+from image_scrapper.constants.paths import CACHE
+from image_scrapper.helpers import ordered_map
 
+# Resolved stash items, saved if disk persistence is enabled
+STASH_CACHE = CACHE / 'deviantart' / 'stash.json'
+
+# Image urls are signed and expire, so saved items are used this long
+STASH_CACHE_TTL = 6 * 60 * 60
+
+# Resolved items are saved after this many new ones, and on exit
+STASH_SAVE_EVERY = 100
+
+STASH_ID_REGEX = re.compile(r'sta\.sh/(\w+)')
+
+# Image url and title of stash item
+StashItem = tuple[str, str]
+
+
+@dataclass
+class StashPage:
+    """Data of stash page: single item or folder"""
+
+    item: StashItem | None = None
+    folder_title: str | None = None
+    item_urls: list[str] | None = None
+
+
+class StashResolver:
+    """Resolves sta.sh urls into images, memoized by stash id.
+
+    Same stash folders are often linked from many deviations, so each
+    stash page (single item, folder or folder item) is requested once
+    per run. Threads resolving same stash id wait for the first one.
+
+    Args:
+        path: json file resolved items are saved to between runs.
+            None means memory only [Path|None] (Default: None)
+        ttl: seconds saved items are used for [float] (Default: STASH_CACHE_TTL)
+        save_every: new items after which file is saved [int] (Default: STASH_SAVE_EVERY)
+    """
+
+    def __init__(
+            self, path: Path | None = None, ttl: float = STASH_CACHE_TTL,
+            save_every: int = STASH_SAVE_EVERY):
+        self.path = path
+        self.ttl = ttl
+        self.save_every = save_every
+
+        # Stash id -> (time resolved, items)
+        self._results: dict[str, tuple[float, list[StashItem]]] = {}
+        self._pending: dict[str, Future] = {}
+        self._unsaved = 0
+        self._lock = Lock()
+
+        if path:
+            self._load()
+            atexit.register(self.save)
+
+    def resolve(self, client: ScrapperApi, url: str) -> list[StashItem]:
+        """Images of stash url: single image or all images of folder"""
+
+        items = self._memoized(url, partial(_get_stash_page, client, self))
+
+        if self.path and self._unsaved >= self.save_every:
+            self.save()
+
+        return items
+
+    def resolve_file(self, client: ScrapperApi, url: str) -> StashItem:
+        """Image of single stash item"""
+
+        return self._memoized(
+            url, lambda url: [client.extract(_extract_stash_file, client.get(url))],
+        )[0]
+
+    def _memoized(
+            self, url: str,
+            resolve: Callable[[str], list[StashItem]]) -> list[StashItem]:
+
+        key = _stash_id(url)
+
+        with self._lock:
+            if (result := self._results.get(key)) \
+                    and time.time() - result[0] < self.ttl:
+                return result[1]
+
+            if (future := self._pending.get(key)):
+                owner = False
+            else:
+                owner = True
+                future = self._pending[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            items = resolve(url)
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+
+        # Stored in the same step, so threads coming after find result
+        with self._lock:
+            self._results[key] = time.time(), items
+            self._unsaved += 1
+            del self._pending[key]
+
+        future.set_result(items)
+        return items
+
+    def _load(self):
+
+        try:
+            with self.path.open(encoding='UTF-8') as file:
+                saved = json.load(file)
+        except (FileNotFoundError, ValueError):
+            return
+
+        now = time.time()
+        self._results = {
+            key: (resolved, [tuple(item) for item in items])
+                for key, (resolved, items) in saved.items()
+                if now - resolved < self.ttl
+        }
+        ic(f'Loaded {len(self._results)} stash items')
+
+    def save(self):
+        """Saves resolved items to path, if there are new ones"""
+
+        with self._lock:
+            if not self._unsaved:
+                return
+
+            saved = {
+                key: [resolved, items]
+                    for key, (resolved, items) in self._results.items()
+            }
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Interrupted write must not lose saved items
+            temp_path = self.path.with_name(
+                f'{self.path.name}.{os.getpid()}.tmp')
+            with temp_path.open('w', encoding='UTF-8') as file:
+                json.dump(saved, file)
+            os.replace(temp_path, self.path)
+
+            self._unsaved = 0
+
+
+def _stash_id(url: str) -> str:
+    return match[1] if (match := STASH_ID_REGEX.search(url)) else url
+
+def _get_stash_page(
+        client: ScrapperApi, resolver: StashResolver,
+        url: str) -> list[StashItem]:
+
+    page = client.extract(_extract_stash_page, client.get(url))
+
+    if page.item:
+        return [page.item]
+
+    return list(_get_stash_folder(
+        client, resolver, page.item_urls, page.folder_title))
+
+def _extract_stash_page(markup: str) -> StashPage:
+
+    main = parse_html(markup)
 
-def _get_stash_page(client: ScrapperApi, main: bs):
-    
     # If url leads to single image
     if not (folder_title_tag := main.select_one('h2')):
+        return StashPage(item=_get_stash_file(main))
 
-        yield _get_stash_file(main)
-        return
+    return StashPage(
+        folder_title=folder_title_tag.text,
+        item_urls=[
+            a.attrs['href']
+                for a in main.select('.stash-thumb-container.already-uploaded a.t')
+        ],
+    )
 
-    folder_title = folder_title_tag.text
-    yield from _get_stash_folder(client, main, folder_title)
+def _extract_stash_file(markup: str) -> StashItem:
+    return _get_stash_file(parse_html(markup))
 
-def _get_stash_file(main: bs) -> tuple[str, str]:
+def _get_stash_file(main: Node) -> StashItem:
     """Gets data of a single stash image"""
 
     img_tags = main.select('img[collect_rid]')
@@ -28,49 +210,52 @@ def _get_stash_file(main: bs) -> tuple[str, str]:
 
     return img_url, img_title
 
-def _get_stash_folder(client: ScrapperApi, main: bs, folder_title: str) -> Iterable[tuple[str, str]]:
-    
-    # Iterate over all item anchor tags in folder page
-    for i, a in enumerate(main.select('.stash-thumb-container.already-uploaded a.t'), 1):
+def _get_stash_folder(
+        client: ScrapperApi, resolver: StashResolver,
+        item_urls: list[str], folder_title: str) -> Iterable[StashItem]:
+    """Item pages of folder are requested in parallel"""
 
-        stash_url = a.attrs['href']
-        ic(stash_url)
-        page_res = client.get(stash_url)
+    items = ordered_map(
+        partial(resolver.resolve_file, client), item_urls,
+        workers=RESOLVE_WORKERS,
+    )
 
-        img_url, img_title = _get_stash_file(bs(page_res.text, 'lxml'))
+    for i, (img_url, img_title) in enumerate(items, 1):
         yield img_url, f'[{folder_title}] [{i}] {img_title}'
 
-def get_stash_urls(client: ScrapperApi, da_main: bs) -> Iterable[tuple[str, str]]:
-    """Goes over all sta.sh urls found in deviation's description.
-    Separately processes sta.sh singles and folders."""
+def find_stash_urls(da_main: Node) -> list[str]:
+    """Collects all sta.sh urls found in deviation's description"""
 
     desc_tag = da_main.select_one('.da-editor-journal') or da_main.select_one('.legacy-journal')
 
     if not desc_tag:
-        return None
-    
-    # Collect all sta.sh urls
+        return []
+
     all_urls = (a.attrs['href'] for a in desc_tag.select('a'))
-    stash_urls = {url.partition('?')[0] for url in all_urls if 'sta.sh' in url}
+    return sorted({url.partition('?')[0] for url in all_urls if 'sta.sh' in url})
+
+def get_stash_urls(
+        client: ScrapperApi, resolver: StashResolver,
+        stash_urls: list[str]) -> Iterable[StashItem]:
+    """Goes over sta.sh urls of deviation's description.
+    Separately processes sta.sh singles and folders.
+    Urls are resolved in parallel."""
 
     # IF none are found stop generator
     if not stash_urls:
         return None
 
-    for url in stash_urls:
-
-        page_res = client.get(url)
-        main = bs(page_res.text, 'lxml')
+    resolved = ordered_map(
+        partial(resolver.resolve, client), stash_urls,
+        workers=RESOLVE_WORKERS,
+    )
 
-        yield from _get_stash_page(client, main)
+    for items in resolved:
+        yield from items
 
 __all__ = [
-    'get_stash_urls'
+    'STASH_CACHE',
+    'StashResolver',
+    'find_stash_urls',
+    'get_stash_urls',
 ]
-
-        
-            
-
-        
-
-    
\ No newline at end of file
@@ -1,41 +1,222 @@
+import html
+import re
+from dataclasses import dataclass, field
+from functools import partial
+from threading import Event
+from typing import Iterable
 
-from bs4 import BeautifulSoup as bs
+import httpx
 from icecream import ic
 
 from image_scrapper.constants.paths import DOWNLOADS
 from image_scrapper.api import (
-    GalleryApi, GalleryParseParams
+    GalleryApi, GalleryPackage, GalleryParseParams, Node, RateLimits,
+    gallery_meta, parse_html
 )
+from image_scrapper.helpers import ordered_map
 
+LOCAL_PARSE_PARAMS = GalleryParseParams(
+    title_header_selector='h1',
+    page_count_selector='.ptt td:nth-last-of-type(2) a',
 
+    big_img_selector='#i3 img',
+    big_img_attr='src',
+
+    download_dir=DOWNLOADS / 'e-hentai',
+)
+
+# Gallery and image pages count towards e-hentai page view limit.
+# Images are served by many H@H hosts, each with own budget
+LOCAL_RATE_LIMITS = RateLimits(page_rate=1., page_burst=4, file_rate=2.)
+
+API_URL = 'https://api.e-hentai.org/api.php'
+
+# Image page url: /s/[imgkey]/[gid]-[page]
+IMAGE_PAGE_REGEX = re.compile(r'/s/(\w+)/(\d+)-(\d+)')
+
+SHOWKEY_REGEX = re.compile(r'var showkey\s*=\s*"(\w+)"')
+API_IMAGE_REGEX = re.compile(r'<img id="img" src="([^"]+)"')
+
+
+class ApiError(Exception):
+    """e-hentai api returned error or unexpected response"""
+    ...
+
+
+@dataclass
 class LocalApi(GalleryApi):
 
-    parse_params = GalleryParseParams(
-        title_header_selector='h1',
-        page_count_selector='.ptt td:nth-last-of-type(2) a',
+    # Default must be set on dataclass field,
+    # plain class attribute is overwritten by GalleryApi.__init__
+    parse_params: GalleryParseParams = field(
+        default_factory=lambda: LOCAL_PARSE_PARAMS)
+
+    # Resolve image urls with json api (showpage) instead of image pages
+    use_json_api: bool = field(default=True, kw_only=True)
+
+    def parse(self, response: httpx.Response) -> GalleryPackage:
+
+        gallery_url, _, query = str(response.url).partition('?')
+
+        (gallery_id, title, page_count), first_links = self.extract(
+            _extract_gallery, response, self.parse_params, gallery_url)
+
+        # Gallery page is the first thumbnail index page, unless
+        # url points to another one
+        image_page_urls = self.generate_page_urls(
+            gallery_url, page_count,
+            first_links=None if query else first_links)
+        image_urls = self.parse_page_urls(image_page_urls)
+
+        return GalleryPackage(
+            gallery_id, title, image_urls, self.parse_params.download_dir)
+
+    def generate_page_urls(
+            self, gallery_url: str, page_count: int,
+            first_links: list[str] | None = None) -> Iterable[str]:
+        """Collects image page urls from thumbnail index pages.
+        Index pages are fetched in parallel.
+
+        Args:
+            first_links: image page urls of already fetched first index page
+        """
+
+        gallery_url = gallery_url.partition('?')[0]
+        index_urls = [gallery_url + f'?p={i}' for i in range(page_count)]
+
+        first_page_n = 1
+
+        if first_links is not None:
+            yield from first_links
+            index_urls = index_urls[1:]
+            first_page_n = 2
+
+        image_links = ordered_map(
+            self._get_index_page_links, index_urls,
+            workers=self.parse_params.resolve_workers,
+        )
+
+        for i, links in enumerate(image_links, first_page_n):
+            ic(f'Got page {i}!')
+            yield from links
+
+    def _get_index_page_links(self, index_url: str) -> list[str]:
+        return self.extract(_extract_index_links, self.get(index_url))
+
+    def parse_page_urls(self, page_urls: Iterable[str]) -> Iterable[str]:
+        """Resolves image urls with json api. Api needs showkey, found in
+        any image page, so the first image page is still fetched. Falls
+        back to image pages if api fails."""
+
+        if not self.use_json_api:
+            yield from super().parse_page_urls(page_urls)
+            return
 
-        big_img_selector='#i3 img',
-        big_img_attr='src',
+        page_urls = iter(page_urls)
 
-        download_dir=DOWNLOADS / 'e-hentai',
+        if (first_page_url := next(page_urls, None)) is None:
+            return
+
+        selector, tag_attr = self.parse_params.big_img_selectors
+        image_url, showkey = self.extract(
+            _extract_first_image, self.get(first_page_url), selector, tag_attr)
+
+        yield image_url
+
+        if not showkey:
+            ic('No showkey on image page, api is not used')
+            yield from super().parse_page_urls(page_urls)
+            return
+
+        resolve = partial(self._show_page, showkey, Event())
+        image_urls = ordered_map(
+            resolve, page_urls, workers=self.parse_params.resolve_workers)
+
+        for i, image_url in enumerate(image_urls, 2):
+            ic(f'Got image {i}')
+            yield image_url
+
+    def _show_page(
+            self, showkey: str, api_failed: Event, page_url: str) -> str:
+        """Gets image url with showpage api method. After first api failure
+        the rest of gallery is resolved from image pages."""
+
+        if not api_failed.is_set():
+            try:
+                return self._request_image_url(showkey, page_url)
+            except (httpx.HTTPError, ApiError) as error:
+                ic(f'Api failed, parsing image pages: {error!r}')
+                api_failed.set()
+
+        return self.parse_page_url(page_url)
+
+    def _request_image_url(self, showkey: str, page_url: str) -> str:
+
+        if not (match := IMAGE_PAGE_REGEX.search(page_url)):
+            raise ApiError(f'Unknown image page url: {page_url}')
+
+        imgkey, gallery_id, page = match.groups()
+
+        data = self.api_request({
+            'method': 'showpage',
+            'gid': int(gallery_id),
+            'page': int(page),
+            'imgkey': imgkey,
+            'showkey': showkey,
+        })
+
+        if not (image := API_IMAGE_REGEX.search(data.get('i3', ''))):
+            raise ApiError(f'No image in api response for {page_url}')
+
+        return html.unescape(image[1])
+
+    def api_request(self, payload: dict) -> dict:
+
+        response = self.post(API_URL, json=payload)
+
+        try:
+            data = response.json()
+        except ValueError as error:
+            raise ApiError(f'Invalid api response: {error}') from error
+
+        if not isinstance(data, dict) or 'error' in data:
+            raise ApiError(f'Api error: {data}')
+
+        return data
+
+
+def _extract_gallery(
+        markup: str, parse_params: GalleryParseParams,
+        gallery_url: str) -> tuple[tuple[str, str, int], list[str]]:
+    """Gallery meta and image page urls of gallery page"""
+
+    soup = parse_html(markup)
+    return (
+        gallery_meta(soup, parse_params, gallery_url),
+        _index_page_links(soup),
     )
-    
-    def generate_page_urls(self, page_count: int) -> list[str]:
-        
-        for i in range(page_count):
-            
-            g_page_url = self.current_url + f'?p={i}'
-            g_page_res = self.get(g_page_url)
 
-            ic(f'Got page {i+1}!')
+def _extract_index_links(markup: str) -> list[str]:
+    return _index_page_links(parse_html(markup))
+
+def _extract_first_image(
+        markup: str, selector: str, tag_attr: str) -> tuple[str, str | None]:
+    """Image url and api showkey of image page"""
+
+    showkey = SHOWKEY_REGEX.search(markup)
+    image_url = parse_html(markup).select_one(selector).attrs[tag_attr]
+
+    return image_url, showkey and showkey[1]
 
-            soup = bs(g_page_res.text, 'lxml')
+def _index_page_links(soup: Node) -> list[str]:
 
-            images_list_tag = soup.select_one('#gdt')
+    images_list_tag = soup.select_one('#gdt')
 
-            for image_tag in images_list_tag.select('.gdtm a'):
-                yield image_tag.attrs['href']
+    return [
+        image_tag.attrs['href']
+            for image_tag in images_list_tag.select('.gdtm a')
+    ]
 
 __all__ = [
     'LocalApi',
-]
\ No newline at end of file
+]
@@ -1,27 +1,47 @@
 
 import re
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from functools import partial
+from itertools import chain, count
+from operator import itemgetter
 from typing import Iterable
 from urllib.parse import unquote
 
 import httpx
-from bs4 import BeautifulSoup as bs
 
 from image_scrapper.api import (
-    AuthorPackage, DownloadUnit, ScrapperApi,
-    construct_package_name
+    AuthorPackage, CollectionPackage, DownloadUnit, ScrapperApi,
+    construct_package_name, parse_html
 )
+from image_scrapper.constants.network import RESOLVE_WORKERS
 from image_scrapper.constants.paths import DOWNLOADS
-from image_scrapper.helpers import extract_file_extension
+from image_scrapper.helpers import (
+    canonicalize_url, extract_file_extension, ordered_map
+)
 
 DOWNLOAD_DIR = DOWNLOADS / 'kemono_party'
 
 PAGE_ID_REGEX = re.compile('\/([0-9a-zA-Z]+)$')
 
+API_PATH = '/api/v1'
+
+# [service]/user/[creator id]/post/[post id]
+POST_PATH_REGEX = re.compile(r'/(\w+)/user/([\w-]+)/post/(\w+)')
+# [service]/post/[post id], with or without /user/[creator id]
+POST_KEY_REGEX = re.compile(r'/(\w+)(?:/user/[\w-]+)?/post/(\w+)')
+# [service]/user/[creator id]
+CREATOR_PATH_REGEX = re.compile(r'/(\w+)/user/([\w-]+)/?$')
+
+# Files with these extensions are post images, others are attachments
+IMAGE_REGEX = re.compile(r'\.(png|jpe?g|gif|webp)$', re.IGNORECASE)
+
+# Number of posts in one page of creator post list
+CREATOR_PAGE_SIZE = 50
+
 
 @dataclass
 class KemonoPackage(AuthorPackage):
-    
+
     image_urls: list[str]
     attachments: list[tuple[str, str]]
 
@@ -50,41 +70,194 @@ class KemonoPackage(AuthorPackage):
         )
 
         for a_name, a_url in self.attachments:
-            
+
             file_path = DOWNLOAD_DIR / self.author / (
                 a_base_name + f' - {a_name}'
             )
             yield DownloadUnit(a_url, file_path)
 
 
+@dataclass
 class LocalApi(ScrapperApi):
-    
-    def parse(self, response: httpx.Response) -> KemonoPackage:
+
+    # Resolve posts with json api instead of post pages
+    use_json_api: bool = field(default=True, kw_only=True)
+
+    # Creator names by (service, creator id)
+    _creator_names: dict[tuple[str, str], str] = field(
+        default_factory=dict, init=False, repr=False)
+
+    def canonical_url(self, url: str) -> str:
+
+        # Post and creator pages ignore query (e.g. ?o= list offset)
+        url = canonicalize_url(url, keep_query=False)
+        page_url = httpx.URL(url)
+
+        if (match := POST_KEY_REGEX.search(page_url.path)):
+            service, post_id = match.groups()
+            return (f'{page_url.scheme}://{page_url.host}'
+                    f'/{service}/post/{post_id}')
+
+        return url
+
+    def request_url(self, url: str) -> str:
+
+        if not self.use_json_api:
+            return url
+
+        page_url = httpx.URL(url)
+        origin = f'{page_url.scheme}://{page_url.host}'
+
+        if (match := POST_PATH_REGEX.search(page_url.path)):
+            service, creator_id, post_id = match.groups()
+            return (f'{origin}{API_PATH}/{service}/user/{creator_id}'
+                    f'/post/{post_id}')
+
+        if (match := CREATOR_PATH_REGEX.search(page_url.path)):
+            service, creator_id = match.groups()
+            return f'{origin}{API_PATH}/{service}/user/{creator_id}/profile'
+
+        return url
+
+    def parse(self, response: httpx.Response) -> KemonoPackage | CollectionPackage:
+
+        path = response.url.path
+
+        if not path.startswith(API_PATH):
+            return self.parse_page(response)
+
+        if path.endswith('/profile'):
+            return self.parse_creator(response)
+
+        data = response.json()
+
+        # Api returned post itself in older versions
+        if isinstance(data, list):
+            data = data[0]
+        post = data.get('post', data)
+
+        origin = f'{response.url.scheme}://{response.url.host}'
+        author = self.get_creator_name(origin, post['service'], post['user'])
+
+        return _post_package(post, author, origin)
+
+    def get_creator_name(
+            self, origin: str, service: str, creator_id: str) -> str:
+
+        key = service, creator_id
+
+        if key not in self._creator_names:
+            profile = self.get(
+                f'{origin}{API_PATH}/{service}/user/{creator_id}/profile')
+            self._creator_names[key] = profile.json()['name']
+
+        return self._creator_names[key]
+
+    def parse_creator(self, response: httpx.Response) -> CollectionPackage:
+        """All posts of creator, newest first. Post list pages are
+        requested in parallel while previous posts are downloaded."""
+
+        profile = response.json()
+        service, creator_id = profile['service'], profile['id']
+        self._creator_names[service, creator_id] = profile['name']
+
+        origin = f'{response.url.scheme}://{response.url.host}'
+        posts_url = f'{origin}{API_PATH}/{service}/user/{creator_id}'
+
+        def make_packages(posts: Iterable[dict]) -> Iterable[KemonoPackage]:
+            for post in posts:
+                yield _post_package(post, profile['name'], origin)
+
+        return self.collect(
+            f'{service}-{creator_id}', self._creator_posts(posts_url),
+            itemgetter('id'), make_packages,
+        )
+
+    def _creator_posts(self, posts_url: str) -> Iterable[dict]:
+
+        first_page = self._get_posts_page(posts_url, 0)
+        pages = [first_page]
+
+        # Small creators need no parallel requests
+        if len(first_page) == CREATOR_PAGE_SIZE:
+            pages = chain(pages, ordered_map(
+                partial(self._get_posts_page, posts_url),
+                count(CREATOR_PAGE_SIZE, CREATOR_PAGE_SIZE),
+                workers=RESOLVE_WORKERS, window=RESOLVE_WORKERS,
+            ))
+
+        # Post list ends with incomplete page
+        for posts in pages:
+            yield from posts
+
+            if len(posts) < CREATOR_PAGE_SIZE:
+                return
+
+    def _get_posts_page(self, posts_url: str, offset: int) -> list[dict]:
+        return self.get(f'{posts_url}?o={offset}').json()
+
+    def parse_page(self, response: httpx.Response) -> KemonoPackage:
+        """Parses html post page"""
 
         # TODO: if post body contains links leading to files add them to attachments\
 
-        # dump_response_text(response, 'kemono')
-        
         post_id = PAGE_ID_REGEX.search(response.url.path)[1]
 
-        soup = bs(response.text, 'lxml')
-
-        title = soup.select_one('h1 span').text.strip()
-        author = soup.select_one('.post__user-name').text.strip()
-
-        image_urls = [
-            image_tag.attrs['href']
-                for image_tag in soup.select('.fileThumb')
-        ]
-        
-        attachment_tags = soup.select('.post__attachment-link')
-        attachments = [
-            (unquote(tag.attrs['download']), tag.attrs['href'])
-                for tag in attachment_tags
-        ]
-        
         return KemonoPackage(
-            post_id, title, author, image_urls, attachments)
+            post_id, *self.extract(_extract_post_page, response))
+
+
+def _extract_post_page(
+        markup: str) -> tuple[str, str, list[str], list[tuple[str, str]]]:
+    """Title, author, image urls and attachments of post page"""
+
+    soup = parse_html(markup)
+
+    title = soup.select_one('h1 span').text.strip()
+    author = soup.select_one('.post__user-name').text.strip()
+
+    image_urls = [
+        image_tag.attrs['href']
+            for image_tag in soup.select('.fileThumb')
+    ]
+
+    attachment_tags = soup.select('.post__attachment-link')
+    attachments = [
+        (unquote(tag.attrs['download']), tag.attrs['href'])
+            for tag in attachment_tags
+    ]
+
+    return title, author, image_urls, attachments
+
+
+def _post_package(post: dict, author: str, origin: str) -> KemonoPackage:
+    """Makes package of api post. Images are post file and image
+    attachments, other files are attachments"""
+
+    files = [post['file']] if post.get('file') else []
+    files += post.get('attachments') or []
+
+    image_urls = []
+    attachments = []
+    seen_paths = set()
+
+    for file in files:
+
+        # Post file is usually repeated in attachments
+        if not (path := file.get('path')) or path in seen_paths:
+            continue
+        seen_paths.add(path)
+
+        url = f'{origin}/data{path}'
+        name = file.get('name') or path.rpartition('/')[2]
+
+        if IMAGE_REGEX.search(name) or IMAGE_REGEX.search(path):
+            image_urls.append(url)
+        else:
+            attachments.append((name, url))
+
+    return KemonoPackage(
+        post['id'], post['title'], author, image_urls, attachments)
 
 __all__ = [
     'LocalApi'
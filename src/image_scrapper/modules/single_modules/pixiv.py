@@ -2,22 +2,26 @@
 
 import json
 import re
-from typing import Iterable
+import time
+from functools import partial
+from itertools import islice
+from typing import Callable, Iterable
+from urllib.parse import urlencode
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 import httpx
-from bs4 import BeautifulSoup as bs
 from icecream import ic
 
 from image_scrapper.api import (
-    AuthorPackage, DownloadUnit, ScrapperApi,
-    UnloggedError, construct_package_name,
+    AuthorPackage, CollectionPackage, DownloadUnit, Node, RateLimits,
+    ScrapperApi, UnloggedError, construct_package_name, parse_html,
 )
+from image_scrapper.constants.network import RESOLVE_WORKERS
 from image_scrapper.constants.paths import COOKIES, DOWNLOADS
 from image_scrapper.helpers import (
     extract_file_extension,
+    ordered_map,
     write_cookies,
-    retry_times,
 )
 
 LOCAL_HEADERS = {'referer': 'https://www.pixiv.net/'}
@@ -25,14 +29,58 @@ LOCAL_HEADERS = {'referer': 'https://www.pixiv.net/'}
 LOCAL_DOWNLOADS = DOWNLOADS / 'pixiv'
 LOCAL_COOKIES = COOKIES / 'pixiv'
 
+# Pixiv bans quickly for page scraping, i.pximg.net is more tolerant
+LOCAL_RATE_LIMITS = RateLimits(page_rate=1., file_rate=4., file_burst=4)
+
 PAGE_ID_REGEX = re.compile('\/([0-9]+)$')
+# Profile of user and its works tabs. Other user pages (e.g. bookmarks)
+# are not works of user
+USER_ID_REGEX = re.compile(
+    r'^/(?:en/)?users/([0-9]+)(?:/(?:artworks|illustrations|manga))?/?$')
+
+# /artworks/[id], /en/artworks/[id] or member_illust.php?illust_id=[id]
+ARTWORK_ID_REGEX = re.compile(r'(?:/artworks/|[?&]illust_id=)([0-9]+)')
+
+AJAX_API = 'https://www.pixiv.net/ajax/'
+
+# User urls are requested as profile, which lists ids of all works
+PROFILE_PATH_REGEX = re.compile(r'^/ajax/user/([0-9]+)/profile/all$')
+
+# Number of works requested in one metadata request (as pixiv does)
+WORKS_BATCH_SIZE = 48
+
+# ajax illustType
+ILLUST_TYPE_UGOIRA = 2
 
 UGOIRA_API = 'https://ugoira.com/api/illusts/queue'
 
+# Where ugoira (animation) is downloaded from:
+#   "mp4" - video converted by ugoira.com queue;
+#   "zip" - pixiv's own archive of frames, with frame delays in json file
+UGOIRA_SOURCE = 'mp4'
+
+# Ugoira.com conversion polling. Interval doubles after every check
+UGOIRA_POLL_INTERVAL = 2.
+UGOIRA_POLL_MAX_INTERVAL = 30.
+UGOIRA_TIMEOUT = 600.
+
+
+class UgoiraTimeoutError(Exception):
+    """Ugoira was not converted to mp4 in time"""
+    ...
+
+
+class AjaxError(Exception):
+    """Pixiv ajax api returned error"""
+    ...
+
+
 @dataclass
 class UgoiraPackage(AuthorPackage):
     
-    download_url: str
+    # Waits for conversion and returns mp4 url. Called when package
+    # is downloaded, so parsing does not wait for conversion
+    resolve_url: Callable[[], str] = field(repr=False)
 
     @property
     def contents(self) -> Iterable[DownloadUnit]:
@@ -45,13 +93,40 @@ class UgoiraPackage(AuthorPackage):
         )
         file_path = LOCAL_DOWNLOADS / self.author / file_name
 
-        yield DownloadUnit(self.download_url, file_path)
+        # Already downloaded video does not need conversion
+        if file_path.exists():
+            return
+
+        yield DownloadUnit(self.resolve_url(), file_path)
+
+@dataclass
+class UgoiraZipPackage(AuthorPackage):
+
+    zip_url: str
+    frames: list[dict[str, str | int]] = field(repr=False)
+
+    @property
+    def contents(self) -> Iterable[DownloadUnit]:
+
+        base_name = construct_package_name(
+            pack_id=self.id,
+            title=self.title,
+            author=self.author,
+        )
+        base_path = LOCAL_DOWNLOADS / self.author
+
+        yield DownloadUnit(self.zip_url, base_path / f'{base_name}.zip')
+        yield DownloadUnit(
+            json.dumps(self.frames, indent=2),
+            base_path / f'{base_name}.frames.json',
+            kind='text',
+        )
         
 @dataclass
 class IllustrationPackage(AuthorPackage):
     
-    base_url: str
-    page_count: int
+    # Original image url of every page
+    image_urls: list[str]
 
     @property
     def contents(self) -> Iterable[DownloadUnit]:
@@ -60,21 +135,24 @@ class IllustrationPackage(AuthorPackage):
             pack_id=self.id,
             title=self.title,
             author=self.author,
-            file_extension=extract_file_extension(self.base_url),
             multipage=True
         )
         
-        for i in range(self.page_count):
+        # Pages of one illustration may have different formats
+        for i, download_url in enumerate(self.image_urls, 1):
             
-            download_url = self.base_url.format(i)
-            file_path = LOCAL_DOWNLOADS / self.author / base_name.format(i+1)
+            file_extension = extract_file_extension(download_url)
+            file_name = f'{base_name.format(i)}.{file_extension}'
+            file_path = LOCAL_DOWNLOADS / self.author / file_name
 
             yield DownloadUnit(download_url, file_path)
             
-PixivPackage = IllustrationPackage | UgoiraPackage
+PixivPackage = (
+    IllustrationPackage | UgoiraPackage | UgoiraZipPackage | CollectionPackage
+)
 
 def _get_preload_json(
-        soup: bs) -> dict[str, int | str]:
+        soup: Node) -> dict[str, int | str]:
         
     meta_preload = soup.select_one('#meta-preload-data')
 
@@ -83,11 +161,29 @@ def _get_preload_json(
 
     return json.loads(meta_preload.attrs['content'])
 
+def _extract_illust_data(markup: str, px_id: str) -> dict:
+    """Preload data of illustration only, without other page data"""
+    return _get_preload_json(parse_html(markup))['illust'][px_id]
+
+def _ajax_body(response: httpx.Response, path: str) -> dict:
+    """Body of ajax api response. Raises AjaxError on api error"""
+
+    response_json = response.json()
 
+    if response_json.get('error'):
+        raise AjaxError(f'{path}: {response_json.get("message")}')
+
+    return response_json['body']
+
+
+@dataclass
 class LocalApi(ScrapperApi):
 
-    @retry_times(5)
-    def get_ugoira_mp4_url(self, px_id: str):
+    ugoira_source: str = field(default=UGOIRA_SOURCE, kw_only=True)
+
+    def get_ugoira_mp4_url(self, px_id: str) -> str | None:
+        """Queues ugoira conversion. Returns mp4 url if it is converted.
+        Not retried itself, as post already retries transient errors."""
         
         api_response = self.post(UGOIRA_API, {'text': px_id})
         ic(api_response)
@@ -96,13 +192,157 @@ class LocalApi(ScrapperApi):
 
         mp4_url: str = response_json['data'][0]['preview'].get('mp4')
         return mp4_url
+
+    def wait_ugoira_mp4_url(
+            self, px_id: str, mp4_url: str | None = None) -> str:
+        """Polls conversion queue with growing interval until ugoira
+        is converted. Raises UgoiraTimeoutError after UGOIRA_TIMEOUT"""
+
+        deadline = time.monotonic() + UGOIRA_TIMEOUT
+        interval = UGOIRA_POLL_INTERVAL
+
+        while not mp4_url:
+
+            if time.monotonic() + interval > deadline:
+                raise UgoiraTimeoutError(
+                    f'Ugoira {px_id} was not converted '
+                    f'in {UGOIRA_TIMEOUT:.0f}s')
+
+            ic(f'Ugoira {px_id} is not ready, next check in {interval:.0f}s')
+            time.sleep(interval)
+            interval = min(interval * 2, UGOIRA_POLL_MAX_INTERVAL)
+
+            mp4_url = self.get_ugoira_mp4_url(px_id)
+
+        return mp4_url
+
+    def ajax(self, path: str, params: list[tuple[str, str]] | None = None):
+        """Requests pixiv ajax api. Returns response body"""
+
+        url = AJAX_API + path
+        if params:
+            url += '?' + urlencode(params)
+
+        return _ajax_body(self.get(url), path)
+
+    def get_ugoira_meta(self, px_id: str) -> dict:
+        """Gets frames archive url and frame delays from pixiv"""
+        return self.ajax(f'illust/{px_id}/ugoira_meta')
+
+    def get_page_urls(self, px_id: str) -> list[str]:
+        """Gets original image urls of all illustration pages"""
+        pages = self.ajax(f'illust/{px_id}/pages')
+        return [page['urls']['original'] for page in pages]
+
+    def parse_ugoira(
+            self, px_id: str, title: str, author: str,
+            ) -> UgoiraPackage | UgoiraZipPackage:
+
+        if self.ugoira_source == 'zip':
+            meta = self.get_ugoira_meta(px_id)
+            return UgoiraZipPackage(
+                px_id, title, author, meta['originalSrc'], meta['frames'])
+
+        # Conversion starts now and is awaited when package is downloaded
+        mp4_url = self.get_ugoira_mp4_url(px_id)
+
+        return UgoiraPackage(
+            px_id, title, author,
+            partial(self.wait_ugoira_mp4_url, px_id, mp4_url))
     
+    def parse_user(
+            self, user_id: str, profile: dict | None = None,
+            ) -> CollectionPackage:
+        """All illustrations and manga of user, newest first.
+
+        Metadata of works is requested in batches, pages of works
+        in parallel. Works are resolved while previous ones are downloaded.
+
+        Args:
+            user_id: pixiv user id [str]
+            profile: body of user's profile/all response, requested
+                if not given [dict|None] (Default: None)
+        """
+
+        if profile is None:
+            profile = self.ajax(f'user/{user_id}/profile/all')
+
+        work_ids = sorted(
+            (*(profile.get('illusts') or {}), *(profile.get('manga') or {})),
+            key=int, reverse=True,
+        )
+        ic(f'User {user_id} has {len(work_ids)} works')
+
+        return self.collect(
+            f'user-{user_id}', work_ids, str,
+            partial(self._user_works, user_id),
+        )
+
+    def _user_works(
+            self, user_id: str, work_ids: Iterable[str],
+            ) -> Iterable[PixivPackage]:
+
+        # Ids may be a lazy stream (sync stops it at known work)
+        work_ids = iter(work_ids)
+        batches = iter(
+            lambda: list(islice(work_ids, WORKS_BATCH_SIZE)), [])
+
+        works_meta = ordered_map(
+            partial(self._get_works_meta, user_id), batches,
+            workers=RESOLVE_WORKERS,
+        )
+        works = (work for batch in works_meta for work in batch)
+
+        yield from ordered_map(
+            self._work_package, works, workers=RESOLVE_WORKERS)
+
+    def _get_works_meta(self, user_id: str, work_ids: list[str]) -> list[dict]:
+
+        body = self.ajax(f'user/{user_id}/profile/illusts', [
+            *(('ids[]', work_id) for work_id in work_ids),
+            ('work_category', 'illustManga'),
+            ('is_first_page', '0'),
+        ])
+
+        # Deleted or hidden works are missing
+        works = body['works']
+        return [works[work_id] for work_id in work_ids if work_id in works]
+
+    def _work_package(self, work: dict) -> PixivPackage:
+
+        px_id, title, author = work['id'], work['title'], work['userName']
+
+        if work['illustType'] == ILLUST_TYPE_UGOIRA:
+            return self.parse_ugoira(px_id, title, author)
+
+        return IllustrationPackage(
+            px_id, title, author, self.get_page_urls(px_id))
+
+    def canonical_url(self, url: str) -> str:
+
+        if (user_id := USER_ID_REGEX.match(httpx.URL(url).path)):
+            return f'https://www.pixiv.net/users/{user_id[1]}'
+
+        if (px_id := ARTWORK_ID_REGEX.search(url)):
+            return f'https://www.pixiv.net/artworks/{px_id[1]}'
+
+        return super().canonical_url(url)
+
+    def request_url(self, url: str) -> str:
+
+        if (user_id := USER_ID_REGEX.match(httpx.URL(url).path)):
+            return f'{AJAX_API}user/{user_id[1]}/profile/all'
+
+        return url
+
     def parse(self, response: httpx.Response) -> PixivPackage:
 
-        soup = bs(response.text, 'lxml')
+        if (user_id := PROFILE_PATH_REGEX.match(response.url.path)):
+            return self.parse_user(
+                user_id[1], _ajax_body(response, response.url.path))
 
         px_id = PAGE_ID_REGEX.search(response.url.path)[1]
-        img_data = _get_preload_json(soup)['illust'][px_id]
+        img_data = self.extract(_extract_illust_data, response, px_id)
 
         title: str = img_data['illustTitle']
         author: str = img_data['userName']
@@ -110,16 +350,13 @@ class LocalApi(ScrapperApi):
         orig_url: str = img_data['urls']['original']
 
         if 'ugoira' in orig_url:
-            while not (ugoira_url := self.get_ugoira_mp4_url(px_id)):
-                pass
-            return UgoiraPackage(
-                px_id, title, author, ugoira_url)
+            return self.parse_ugoira(px_id, title, author)
         
         page_count: int = img_data['pageCount']
-        base_url = orig_url.replace('_p0', '_p{}')
-        return IllustrationPackage(
-            px_id, title, author, base_url, page_count
+        image_urls = (
+            self.get_page_urls(px_id) if page_count > 1 else [orig_url]
         )
+        return IllustrationPackage(px_id, title, author, image_urls)
             
 
 __all__ = [
@@ -0,0 +1,62 @@
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+import httpx
+import pytest
+from icecream import ic
+
+from image_scrapper.api import (
+    DownloadPackage, DownloadUnit, ScrapperApi, client_factory
+)
+
+ic.disable()
+
+
+@dataclass
+class UnitsPackage(DownloadPackage):
+
+    units: list[DownloadUnit]
+
+    @property
+    def contents(self) -> Iterable[DownloadUnit]:
+        yield from self.units
+
+
+@dataclass
+class StubApi(ScrapperApi):
+    """Api downloading package given to it instead of parsing pages"""
+
+    package: DownloadPackage | None = None
+
+    def parse(self, response: httpx.Response) -> DownloadPackage:
+        return self.package
+
+
+@pytest.fixture
+def mock_transport(monkeypatch) -> Callable:
+    """Routes requests of clients created after call to handler"""
+
+    def use(
+            handler: Callable[[httpx.Request], httpx.Response],
+            async_handler: Callable | None = None):
+        """Async clients use async_handler if given (coroutine function)"""
+        monkeypatch.setattr(
+            client_factory, '_transport', httpx.MockTransport(handler))
+        monkeypatch.setattr(
+            client_factory, '_async_transport',
+            httpx.MockTransport(async_handler or handler))
+        monkeypatch.setattr(client_factory, '_host_limits', {})
+
+    return use
+
+
+@pytest.fixture
+def stub_api(mock_transport) -> Callable[..., StubApi]:
+
+    def create(handler, async_handler=None, **options) -> StubApi:
+        mock_transport(handler, async_handler)
+        api = StubApi(client_factory.create_client(), **options)
+        api.module_name = 'stub'
+        return api
+
+    return create
@@ -0,0 +1,91 @@
+import pytest
+
+from image_scrapper import canonical_url
+from image_scrapper.batch import SeenUrls
+from image_scrapper.helpers import canonicalize_url
+
+
+@pytest.mark.parametrize('memory_urls, bloom_bits', [
+    # Everything in memory
+    (10_000, 1024),
+    # Spilled to disk, bloom filter mostly rules out new urls
+    (10, 1 << 16),
+    # Spilled to disk, tiny bloom filter with many false positives
+    (10, 64),
+])
+def test_seen_urls(memory_urls, bloom_bits):
+
+    seen = SeenUrls(memory_urls, bloom_bits)
+    keys = [f'https://site.test/{i}' for i in range(500)]
+
+    try:
+        assert all(seen.add(key) for key in keys)
+        assert not any(seen.add(key) for key in keys)
+        assert all(seen.add(key + '/new') for key in keys)
+    finally:
+        seen.close()
+
+
+@pytest.mark.parametrize('url, expected', [
+    ('HTTPS://Site.Test/gallery/1/', 'https://site.test/gallery/1'),
+    ('https://site.test/g?utm_source=x&b=2&fbclid=y&a=1#top',
+     'https://site.test/g?a=1&b=2'),
+])
+def test_canonicalize_url(url, expected):
+    assert canonicalize_url(url) == expected
+
+
+@pytest.mark.parametrize('urls', [
+    [
+        'https://www.pixiv.net/artworks/123',
+        'https://www.pixiv.net/en/artworks/123',
+        'https://www.pixiv.net/artworks/123/',
+        'https://www.pixiv.net/member_illust.php?mode=medium&illust_id=123',
+    ],
+    [
+        'https://www.pixiv.net/users/55',
+        'https://www.pixiv.net/en/users/55?utm_source=share',
+    ],
+    [
+        'https://kemono.su/patreon/post/999',
+        'https://kemono.su/patreon/user/77/post/999',
+        'https://kemono.su/patreon/user/77/post/999/',
+    ],
+    [
+        'https://kemono.su/patreon/user/77',
+        'https://kemono.su/patreon/user/77/',
+        'https://kemono.su/patreon/user/77?o=50',
+    ],
+    [
+        'https://www.deviantart.com/artist/art/Some-Title-12345',
+        'https://www.deviantart.com/Artist/art/Other-Title-12345',
+    ],
+    [
+        'https://www.deviantart.com/artist/gallery',
+        'https://www.deviantart.com/Artist/gallery/',
+        'https://www.deviantart.com/artist/gallery/all',
+    ],
+])
+def test_same_package_urls_have_one_key(urls):
+    assert len({canonical_url(url) for url in urls}) == 1
+
+
+@pytest.mark.parametrize('urls', [
+    # Different posts of one creator
+    ['https://kemono.su/patreon/user/77/post/1',
+     'https://kemono.su/patreon/user/77/post/2'],
+    # Same post id on different services
+    ['https://kemono.su/patreon/post/1', 'https://kemono.su/fanbox/post/1'],
+    # User and artwork with same id
+    ['https://www.pixiv.net/users/123', 'https://www.pixiv.net/artworks/123'],
+    # Scraps are not part of whole gallery
+    ['https://www.deviantart.com/artist/gallery/all',
+     'https://www.deviantart.com/artist/gallery/scraps'],
+])
+def test_different_package_urls_have_different_keys(urls):
+    assert len({canonical_url(url) for url in urls}) == len(urls)
+
+
+@pytest.mark.parametrize('line', ['', '# comment', 'https://unknown.test/a'])
+def test_unsupported_lines_have_no_key(line):
+    assert canonical_url(line) is None
@@ -0,0 +1,25 @@
+import httpx
+
+from image_scrapper.api import RateLimiter, RateLimits, ResponseCache
+
+
+def page_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, text='<html></html>')
+
+
+def test_fresh_cache_hit_does_not_use_rate_limit(stub_api, tmp_path, monkeypatch):
+
+    waits = []
+    monkeypatch.setattr(
+        RateLimiter, 'wait', lambda self, kind, url: waits.append(url))
+
+    api = stub_api(
+        page_handler,
+        cache=ResponseCache(tmp_path, ttl=60),
+        rate_limiter=RateLimiter(RateLimits(page_rate=1.)),
+    )
+
+    for _ in range(3):
+        api.get('https://site.test/page')
+
+    assert waits == ['https://site.test/page']
@@ -0,0 +1,17 @@
+import importlib.util
+
+from image_scrapper.api import ClientFactory
+
+
+def test_http2_enabled_later_falls_back_without_h2(monkeypatch):
+
+    monkeypatch.setattr(importlib.util, 'find_spec', lambda name: None)
+
+    factory = ClientFactory()
+    # As set by --http2 after factory is created
+    factory.http2 = True
+
+    with factory.create_client():
+        pass
+
+    assert factory.http2 is False
@@ -0,0 +1,68 @@
+import httpx
+import pytest
+
+from image_scrapper.api import client_factory
+from image_scrapper.modules import module_apis
+from image_scrapper.modules.single_modules.deviantart import main_api
+
+api = module_apis['deviantart']
+
+
+@pytest.mark.parametrize('url, key, params', [
+    ('https://www.deviantart.com/Artist/gallery',
+     'https://www.deviantart.com/artist/gallery/all',
+     {'username': 'Artist', 'all_folder': 'true'}),
+    ('https://www.deviantart.com/artist/gallery/12345/some-folder/',
+     'https://www.deviantart.com/artist/gallery/12345',
+     {'username': 'artist', 'folderid': '12345'}),
+    ('https://www.deviantart.com/artist/gallery/scraps',
+     'https://www.deviantart.com/artist/gallery/scraps',
+     {'username': 'artist', 'scraps_folder': 'true'}),
+])
+def test_gallery_urls(url, key, params):
+
+    assert api.canonical_url(url) == key
+
+    request_params = httpx.URL(api.request_url(url)).params
+    assert {name: request_params[name] for name in params} == params
+    assert set(request_params) - set(params) == {'offset', 'limit'}
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.deviantart.com/artist/gallery/12345/folder/extra',
+    'https://www.deviantart.com/artist/gallery-old',
+])
+def test_other_pages_are_requested_as_is(url):
+    assert api.request_url(url) == url
+
+
+def test_outdated_cookies_in_gallery(mock_transport, monkeypatch):
+
+    def handler(request: httpx.Request) -> httpx.Response:
+
+        if request.url.path.startswith('/_napi/'):
+            return httpx.Response(200, json={'hasMore': False, 'results': [
+                {'deviation': {
+                    'deviationId': i,
+                    'url': f'https://www.deviantart.com/artist/art/work-{i}',
+                }}
+                    for i in range(20)
+            ]})
+
+        return httpx.Response(200, text='<html><body>Log In</body></html>')
+
+    prompts = []
+    monkeypatch.setattr('builtins.input', lambda prompt: prompts.append(prompt))
+    monkeypatch.setattr('builtins.print', lambda *args: None)
+    monkeypatch.setattr(main_api, 'write_cookies', lambda *args: None)
+
+    mock_transport(handler)
+    gallery_api = main_api.LocalApi(
+        client_factory.create_client(), download_workers=2)
+    gallery_api.module_name = 'deviantart'
+
+    # Same handler as for single deviations (exits)
+    with pytest.raises(SystemExit):
+        gallery_api.download_from('https://www.deviantart.com/artist/gallery')
+
+    assert prompts == ['auth: ', 'auth_secure: ', 'userinfo: ']
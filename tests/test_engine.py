@@ -0,0 +1,113 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Iterable
+
+import httpx
+
+from conftest import UnitsPackage
+from image_scrapper.api import DownloadPackage, DownloadUnit
+
+FILE_SIZE = 20000
+
+
+def file_handler(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(200, content=b'x' * FILE_SIZE)
+
+
+async def slow_file_handler(request: httpx.Request) -> httpx.Response:
+    # Downloads of concurrent workers overlap
+    await asyncio.sleep(0.01)
+    return file_handler(request)
+
+
+def test_concurrent_download_counts_all_bytes(stub_api, tmp_path):
+
+    units = [
+        DownloadUnit(f'https://files.test/{i}.png', tmp_path / f'{i}.png')
+            for i in range(5)
+    ]
+    api = stub_api(
+        file_handler, slow_file_handler, download_workers=4, host_workers=4,
+        package=UnitsPackage(units),
+    )
+
+    written = api.download_from('https://site.test/gallery')
+
+    on_disk = sum(unit.file_path.stat().st_size for unit in units)
+    assert on_disk == 5 * FILE_SIZE
+    assert written == on_disk
+
+
+@dataclass
+class SlowPackage(DownloadPackage):
+    """Package which blocks while its contents are resolved"""
+
+    unit: DownloadUnit
+    delay: float
+
+    @property
+    def contents(self) -> Iterable[DownloadUnit]:
+        time.sleep(self.delay)
+        yield self.unit
+
+
+def test_blocked_package_does_not_stall_others(stub_api, tmp_path):
+
+    api = stub_api(file_handler, slow_file_handler, download_workers=2)
+
+    # More blocked packages than threads of event loop default executor
+    blocked = [
+        SlowPackage(
+            DownloadUnit(f'https://files.test/b{i}.png', tmp_path / f'b{i}.png'),
+            delay=1.5)
+            for i in range(40)
+    ]
+    quick = UnitsPackage(
+        [DownloadUnit('https://files.test/q.png', tmp_path / 'q.png')])
+
+    with ThreadPoolExecutor(len(blocked)) as executor:
+        blocked_downloads = [
+            executor.submit(api._download_package, package)
+                for package in blocked
+        ]
+        time.sleep(0.2)
+
+        started = time.monotonic()
+        assert api._download_package(quick) == FILE_SIZE
+        assert time.monotonic() - started < 1.
+
+        assert all(download.result() == FILE_SIZE for download in blocked_downloads)
+
+
+def test_host_limit_is_shared_by_engines(stub_api, tmp_path):
+
+    active = 0
+    max_active = 0
+
+    async def counting_handler(request: httpx.Request) -> httpx.Response:
+        nonlocal active, max_active
+        active += 1
+        max_active = max(max_active, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return file_handler(request)
+
+    api = stub_api(
+        file_handler, counting_handler, download_workers=4, host_workers=2)
+
+    packages = [
+        UnitsPackage([
+            DownloadUnit(
+                f'https://files.test/{p}-{i}.png', tmp_path / f'{p}-{i}.png')
+                for i in range(8)
+        ])
+            for p in range(3)
+    ]
+
+    with ThreadPoolExecutor(len(packages)) as executor:
+        written = list(executor.map(api._download_package, packages))
+
+    assert written == [8 * FILE_SIZE] * len(packages)
+    assert max_active == 2
@@ -0,0 +1,22 @@
+import pytest
+
+from image_scrapper.api import parse_html
+from image_scrapper.api.api_extract import BACKENDS
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('prologue', [
+    '',
+    '<?xml version="1.0" encoding="UTF-8"?>\n',
+    "  <?xml version='1.0' encoding='utf-8' standalone='yes'?>",
+])
+def test_parse_document_with_xml_declaration(backend, prologue):
+
+    markup = (
+        f'{prologue}<html><head><title>Title</title></head>'
+        '<body><a class="link" href="/image.png">Image</a></body></html>'
+    )
+    main = parse_html(markup, backend)
+
+    assert main.select_one('title').text == 'Title'
+    assert main.select_one('a.link').attrs['href'] == '/image.png'
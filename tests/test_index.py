@@ -0,0 +1,38 @@
+import sqlite3
+
+from conftest import UnitsPackage
+from image_scrapper.api import DownloadIndex, DownloadUnit
+
+
+def committed_rows(path) -> list[tuple[str, str]]:
+    with sqlite3.connect(path) as db:
+        return db.execute('SELECT path, status FROM units').fetchall()
+
+
+def test_updates_are_committed_in_batches(tmp_path):
+
+    index_path = tmp_path / 'index.sqlite'
+    index = DownloadIndex(index_path, commit_every=3, commit_interval=60.)
+
+    units = [
+        DownloadUnit(f'https://files.test/{i}.png', tmp_path / f'{i}.png')
+            for i in range(4)
+    ]
+    package = UnitsPackage(units)
+
+    tracked = list(index.track(
+        ((package, unit) for unit in units), 'https://site.test', 'stub'))
+    assert tracked == units
+    assert len(committed_rows(index_path)) == 3
+
+    units[0].file_path.write_bytes(b'x')
+    index.complete(units[0].file_path)
+
+    # Uncommitted updates are seen by index
+    assert index.is_complete(units[0].file_path)
+    assert len(committed_rows(index_path)) == 3
+
+    index.flush()
+    rows = dict(committed_rows(index_path))
+    assert len(rows) == 4
+    assert rows[str(units[0].file_path.absolute())] == 'complete'
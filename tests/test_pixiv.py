@@ -0,0 +1,48 @@
+import httpx
+import pytest
+
+from image_scrapper.api import client_factory
+from image_scrapper.modules import module_apis
+from image_scrapper.modules.single_modules.pixiv import LocalApi
+
+api = module_apis['pixiv']
+
+
+def test_user_url_requests_only_profile(mock_transport):
+
+    paths = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        return httpx.Response(200, json={
+            'error': False, 'body': {'illusts': {}, 'manga': []},
+        })
+
+    mock_transport(handler)
+    api = LocalApi(client_factory.create_client())
+    api.module_name = 'pixiv'
+
+    assert api.download_from('https://www.pixiv.net/en/users/55') == 0
+    assert paths == ['/ajax/user/55/profile/all']
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.pixiv.net/users/55',
+    'https://www.pixiv.net/en/users/55/',
+    'https://www.pixiv.net/users/55/artworks',
+    'https://www.pixiv.net/en/users/55/illustrations?p=2',
+    'https://www.pixiv.net/users/55/manga',
+])
+def test_user_works_urls(url):
+    assert api.canonical_url(url) == 'https://www.pixiv.net/users/55'
+    assert api.request_url(url) == (
+        'https://www.pixiv.net/ajax/user/55/profile/all')
+
+
+@pytest.mark.parametrize('url', [
+    'https://www.pixiv.net/users/55/bookmarks/artworks',
+    'https://www.pixiv.net/en/users/55/following',
+])
+def test_other_user_pages_are_not_user_works(url):
+    assert api.canonical_url(url) != 'https://www.pixiv.net/users/55'
+    assert api.request_url(url) == url
@@ -0,0 +1,52 @@
+import httpx
+import pytest
+
+from image_scrapper.api import IncompleteDownloadError
+from image_scrapper.helpers import CircuitBreaker, is_transient
+from image_scrapper.helpers import retry as retry_module
+
+
+def status_error(status: int) -> httpx.HTTPStatusError:
+    request = httpx.Request('GET', 'https://cdn.test/a.png')
+    return httpx.HTTPStatusError(
+        'error', request=request,
+        response=httpx.Response(status, request=request))
+
+
+@pytest.mark.parametrize('error, transient', [
+    (httpx.ConnectError('refused'), True),
+    (httpx.ReadTimeout('timeout'), True),
+    (IncompleteDownloadError('short'), True),
+    (status_error(429), True),
+    (status_error(503), True),
+    (status_error(404), False),
+    (httpx.InvalidURL('bad url'), False),
+    (KeyError('illust'), False),
+    (NotADirectoryError('not a directory'), False),
+])
+def test_is_transient(error, transient):
+    assert is_transient(error) == transient
+
+
+def test_local_error_is_not_retried(stub_api, tmp_path, monkeypatch):
+
+    breaker = CircuitBreaker(threshold=1)
+    monkeypatch.setattr(retry_module, 'circuit_breaker', breaker)
+
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, content=b'x' * 100)
+
+    api = stub_api(handler)
+
+    # Parent of target path is a regular file
+    (tmp_path / 'file').write_bytes(b'')
+    to_path = tmp_path / 'file' / 'image.png'
+
+    with pytest.raises(NotADirectoryError):
+        api._download_file('https://cdn.test/image.png', to_path)
+
+    assert len(requests) == 1
+    assert breaker.remaining('cdn.test') == 0
@@ -0,0 +1,58 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from image_scrapper.modules.single_modules.deviantart import stash
+from image_scrapper.modules.single_modules.deviantart.stash import StashResolver
+
+
+def fake_stash_page(calls: list):
+
+    def get_stash_page(client, resolver, url):
+        calls.append(url)
+        time.sleep(0.01)
+        return [(f'{url}/image.png', 'title')]
+
+    return get_stash_page
+
+
+def test_stash_is_resolved_once(monkeypatch):
+
+    calls = []
+    monkeypatch.setattr(stash, '_get_stash_page', fake_stash_page(calls))
+
+    resolver = StashResolver()
+    barrier = Barrier(16)
+
+    def resolve(i: int):
+        barrier.wait()
+        # Some threads come while first one resolves, some after
+        time.sleep(i * 0.001)
+        return resolver.resolve(None, 'https://sta.sh/0abc')
+
+    with ThreadPoolExecutor(16) as executor:
+        results = list(executor.map(resolve, range(16)))
+
+    assert calls == ['https://sta.sh/0abc']
+    assert all(result == results[0] for result in results)
+
+
+def test_resolved_items_are_saved_in_batches(monkeypatch, tmp_path):
+
+    calls = []
+    monkeypatch.setattr(stash, '_get_stash_page', fake_stash_page(calls))
+
+    path = tmp_path / 'stash.json'
+    resolver = StashResolver(path, save_every=3)
+
+    for i in range(4):
+        resolver.resolve(None, f'https://sta.sh/0{i}')
+        assert path.exists() == (i >= 2)
+
+    resolver.save()
+
+    loaded = StashResolver(path)
+    for i in range(4):
+        loaded.resolve(None, f'https://sta.sh/0{i}')
+
+    assert len(calls) == 4
@@ -0,0 +1,118 @@
+import hashlib
+from pathlib import Path
+
+import httpx
+import pytest
+
+from image_scrapper.api import IncompleteDownloadError, PartialDownload
+
+DATA = bytes(range(256)) * 40
+URL = 'https://files.test/image.png'
+
+
+def range_handler(request: httpx.Request) -> httpx.Response:
+    """Serves DATA, honoring open ended ranges"""
+
+    if not (range_header := request.headers.get('range')):
+        return httpx.Response(200, content=DATA)
+
+    start = int(range_header.removeprefix('bytes=').removesuffix('-'))
+
+    if start >= len(DATA):
+        return httpx.Response(
+            416, headers={'content-range': f'bytes */{len(DATA)}'})
+
+    return httpx.Response(
+        206, content=DATA[start:],
+        headers={'content-range': f'bytes {start}-{len(DATA) - 1}/{len(DATA)}'},
+    )
+
+
+def download(handler, path: Path) -> PartialDownload:
+    """Downloads url as engines do"""
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    download = PartialDownload(path, hashed=True)
+
+    with client.stream(
+            'GET', URL, headers=download.request_headers()) as stream:
+        if download.accept(stream):
+            with download.open() as file:
+                for chunk in stream.iter_bytes(1000):
+                    file.write(chunk)
+
+    download.finish()
+    return download
+
+
+def write_part(path: Path, data: bytes) -> Path:
+    part_path = path.with_name(path.name + '.part')
+    part_path.write_bytes(data)
+    return part_path
+
+
+def test_download_without_part_file(tmp_path):
+
+    path = tmp_path / 'image.png'
+    result = download(range_handler, path)
+
+    assert path.read_bytes() == DATA
+    assert result.digest == hashlib.sha256(DATA).hexdigest()
+
+
+@pytest.mark.parametrize('handler, part_size', [
+    # Resumed from part file
+    (range_handler, 3000),
+    # Part file already complete (416 with matching size)
+    (range_handler, len(DATA)),
+    # Server ignores range, download starts over
+    (lambda request: httpx.Response(200, content=DATA), 3000),
+])
+def test_download_with_part_file(tmp_path, handler, part_size):
+
+    path = tmp_path / 'image.png'
+    part_path = write_part(path, DATA[:part_size])
+
+    result = download(handler, path)
+
+    assert path.read_bytes() == DATA
+    assert not part_path.exists()
+    # Hash covers data written by previous attempt
+    assert result.digest == hashlib.sha256(DATA).hexdigest()
+
+
+def test_unresumable_part_file_is_removed(tmp_path):
+
+    path = tmp_path / 'image.png'
+    # Larger than file on server
+    part_path = write_part(path, DATA + b'x')
+
+    with pytest.raises(IncompleteDownloadError):
+        download(range_handler, path)
+
+    assert not part_path.exists()
+    assert not path.exists()
+
+
+@pytest.mark.parametrize('sent, total, part_kept', [
+    # Connection dropped early, part file is resumed next time
+    (1000, len(DATA), True),
+    # More data than announced, part file is not usable
+    (len(DATA), 2000, False),
+])
+def test_size_mismatch(tmp_path, sent, total, part_kept):
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(
+            206, content=DATA[1000:1000 + sent],
+            headers={'content-range': f'bytes 1000-{999 + sent}/{total}'},
+        )
+
+    path = tmp_path / 'image.png'
+    part_path = write_part(path, DATA[:1000])
+
+    with pytest.raises(IncompleteDownloadError):
+        download(handler, path)
+
+    assert part_path.exists() == part_kept
+    assert not path.exists()